@@ -1,25 +1,52 @@
+import functools
+import hashlib
+import json
 import discord
 from discord import app_commands
 from discord.ext import commands
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
-from app.core.config import DISCORD_TOKEN, GUILD_ID, ROLE_NAME
-from app.bot.commands import schedule_commands, sick_commands
-from app.scheduler.scheduler import start_scheduler
-from app.services.schedule_service import get_active_users
-from app.db.schedule import get_schedule
-from app.utils.time_utils import format_days_display, get_next_role_change_utc, format_timedelta
+from app.core.config import (
+    DISCORD_TOKEN, GUILD_IDS, SHARD_COUNT, MEMBER_CACHE, METRICS_HOST, METRICS_PORT, FORCE_COMMAND_SYNC, PROFILE_DIR,
+)
+from app.core.logger import logger
+from app.core.metrics import (
+    ACTIVE_USERS, DB_QUERY_SECONDS, LOOP_LAG_SECONDS, LOOP_STALLS, ROLE_API_CALLS, TICK_DRIFT_SECONDS, TICK_LAST_SECONDS,
+    TICKS_OVER_BUDGET, start_metrics_server,
+)
+from app.bot.commands import roster_commands, schedule_commands, sick_commands
+from app.scheduler.scheduler import start_scheduler, reconcile_now
+from app.scheduler.watchdog import start_loop_lag_probe, tick_watchdog
+from app.services.snapshot import get_snapshot
+from app.services.drift import check_member
+from app.services.member_cache import forget_member
+from app.services.role_service import find_managed_role, get_role_executor, role_executor_stats
+from app.db import repository
+from app.db.guild_settings import get_role_name
+from app.utils.time_utils import format_days_display, format_timedelta, get_tz, minutes_to_time_str
 
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True  # required for prefix commands like !help
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot_options = {}
+if MEMBER_CACHE == "lean":
+    # Members are fetched on demand by app.services.member_cache instead of all at startup
+    bot_options.update(chunk_guilds_at_startup=False, member_cache_flags=discord.MemberCacheFlags.none())
+if SHARD_COUNT:
+    # One process, several gateway connections; "auto" asks Discord how many shards to use
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, shard_count=None if SHARD_COUNT == "auto" else int(SHARD_COUNT), **bot_options
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, **bot_options)
 bot.remove_command("help")  # use our custom !help below
 
-help_guild = discord.Object(id=GUILD_ID)
+command_guilds = [discord.Object(id=guild_id) for guild_id in GUILD_IDS]
 
 
+@functools.lru_cache(maxsize=None)
 def make_help_embed():
+    """Built once; the command list doesn't change while the bot runs."""
     embed = discord.Embed(
         title="Schedule bot – commands",
         description="Slash commands (type `/` to see them). You can also use `!help`.",
@@ -70,13 +97,13 @@ async def help_prefix(ctx):
     await ctx.send(embed=make_help_embed())
 
 
-@bot.tree.command(name="help", description="List all commands and usage examples", guild=help_guild)
+@bot.tree.command(name="help", description="List all commands and usage examples", guilds=command_guilds)
 async def help_slash(interaction: discord.Interaction):
     """List all commands and usage examples (slash: /help)."""
     await interaction.response.send_message(embed=make_help_embed())
 
 
-@bot.tree.command(name="time", description="Show current time (for testing)", guild=help_guild)
+@bot.tree.command(name="time", description="Show current time (for testing)", guilds=command_guilds)
 async def time_slash(interaction: discord.Interaction):
     """Show current time in UTC and Australia/Sydney."""
     now_utc = datetime.now(timezone.utc)
@@ -90,7 +117,7 @@ async def time_slash(interaction: discord.Interaction):
     await interaction.response.send_message(msg)
 
 
-@bot.tree.command(name="rolestatus", description="Debug: why the At Work role might not be attached", guild=help_guild)
+@bot.tree.command(name="rolestatus", description="Debug: why the At Work role might not be attached", guilds=command_guilds)
 async def rolestatus_slash(interaction: discord.Interaction):
     """Show role/guild status and who should have the role right now."""
     now_utc = datetime.now(timezone.utc)
@@ -103,21 +130,22 @@ async def rolestatus_slash(interaction: discord.Interaction):
         "",
     ]
 
-    guild = interaction.client.get_guild(GUILD_ID)
+    guild = interaction.guild
     if guild is None:
-        lines.append(f"Guild `{GUILD_ID}` not found. Check GUILD_ID in .env and that the bot is in the server.")
+        lines.append(f"Server `{interaction.guild_id}` not found. Check GUILD_IDS in .env and that the bot is in the server.")
         await interaction.response.send_message("\n".join(lines), ephemeral=True)
         return
 
     lines.append(f"Guild: **{guild.name}**")
 
-    role = next((r for r in guild.roles if r.name == ROLE_NAME), None)
+    role = find_managed_role(guild)
     if role is None:
-        lines.append(f"Role **{ROLE_NAME}** not found. Create a role with that exact name (case-sensitive).")
+        role_name = get_role_name(guild.id)
+        lines.append(f"Role **{role_name}** not found. Create a role with that exact name (case-sensitive), or pick one with `/setrole`.")
         await interaction.response.send_message("\n".join(lines), ephemeral=True)
         return
 
-    lines.append(f"Role: **{ROLE_NAME}** (position {role.position})")
+    lines.append(f"Role: **{role.name}** (position {role.position})")
 
     bot_member = guild.get_member(interaction.client.user.id)
     if bot_member:
@@ -127,9 +155,14 @@ async def rolestatus_slash(interaction: discord.Interaction):
         else:
             lines.append(f"   Hierarchy OK (bot can assign this role).")
 
-    active_ids = get_active_users()
+    # Served from the scheduler's latest evaluation, so a burst of /rolestatus costs no schedule scans
+    snapshot = await get_snapshot()
+    active_ids = snapshot.active_in_guild(guild.id)
     lines.append("")
-    lines.append(f"**Should have role right now:** {len(active_ids)} user(s)")
+    lines.append(
+        f"**Should have role:** {len(active_ids)} user(s) "
+        f"(as of {snapshot.taken_at.strftime('%H:%M:%S')} UTC, {format_timedelta(now_utc - snapshot.taken_at)} ago)"
+    )
     if active_ids:
         for uid in active_ids[:10]:
             m = guild.get_member(uid)
@@ -139,28 +172,35 @@ async def rolestatus_slash(interaction: discord.Interaction):
         if len(active_ids) > 10:
             lines.append(f"   ... and {len(active_ids) - 10} more")
 
-    you_in = interaction.user.id in active_ids
+    stats = get_role_executor(guild.id).stats()
+    lines.append(
+        f"Role queue: {stats['queue_depth']} queued, {stats['in_flight']} in flight, "
+        f"p95 {stats['latency_p95']:.2f}s, {stats['retries']} retries, {stats['failed']} failed"
+    )
+
+    you_in = snapshot.is_active(guild.id, interaction.user.id)
     lines.append("")
     lines.append(f"You: **{'On work' if you_in else 'Not on work'}**")
 
-    row = get_schedule(interaction.user.id)
+    row = await repository.get_schedule(guild.id, interaction.user.id)
     if row:
+        tz_name = row["timezone"]
+        tz = get_tz(tz_name)
         lines.append("")
-        lines.append("**Your schedule (Sydney):**")
-        lines.append(f"   {row['start_time']} – {row['end_time']} on {format_days_display(row['days'])}")
-        on_work, next_utc = get_next_role_change_utc(row, now_utc)
+        lines.append(f"**Your schedule ({tz_name}):**")
+        lines.append(f"   {minutes_to_time_str(row['start_min'])} – {minutes_to_time_str(row['end_min'])} on {format_days_display(row['days_mask'])}")
+        on_work, next_utc = snapshot.next_change(guild.id, interaction.user.id) or (False, None)
         if next_utc:
             delta = next_utc - now_utc
-            sick_until_str = row["sick_until"]
-            if sick_until_str and next_utc == datetime.fromisoformat(sick_until_str):
-                lines.append(f"   Sick ends in **{format_timedelta(delta)}** (at {next_utc.astimezone(tz_sydney).strftime('%H:%M')} Sydney).")
+            if row["sick_until"] is not None and next_utc.timestamp() == row["sick_until"]:
+                lines.append(f"   Sick ends in **{format_timedelta(delta)}** (at {next_utc.astimezone(tz).strftime('%H:%M')} {tz_name}).")
             elif on_work:
-                lines.append(f"   Role will be **removed** in **{format_timedelta(delta)}** (at {next_utc.astimezone(tz_sydney).strftime('%H:%M')} Sydney).")
+                lines.append(f"   Role will be **removed** in **{format_timedelta(delta)}** (at {next_utc.astimezone(tz).strftime('%H:%M')} {tz_name}).")
             else:
-                lines.append(f"   Role will be **added** in **{format_timedelta(delta)}** (at {next_utc.astimezone(tz_sydney).strftime('%H:%M')} Sydney).")
-        elif row["sick_until"]:
-            sick_until = datetime.fromisoformat(row["sick_until"])
-            lines.append(f"   Sick until {sick_until.astimezone(tz_sydney).strftime('%Y-%m-%d %H:%M')} Sydney.")
+                lines.append(f"   Role will be **added** in **{format_timedelta(delta)}** (at {next_utc.astimezone(tz).strftime('%H:%M')} {tz_name}).")
+        elif row["sick_until"] is not None:
+            sick_until = datetime.fromtimestamp(row["sick_until"], timezone.utc)
+            lines.append(f"   Sick until {sick_until.astimezone(tz).strftime('%Y-%m-%d %H:%M')} {tz_name}.")
     else:
         lines.append("")
         lines.append("No schedule set. Use `/setwork` to set your work times.")
@@ -168,11 +208,148 @@ async def rolestatus_slash(interaction: discord.Interaction):
     await interaction.response.send_message("\n".join(lines), ephemeral=True)
 
 
+@bot.tree.command(name="reloadschedules", description="Admin: reload schedules after editing the database file", guilds=command_guilds)
+@app_commands.default_permissions(administrator=True)
+async def reloadschedules_slash(interaction: discord.Interaction):
+    """Re-read the schedules table into memory and re-evaluate everyone."""
+    # A large reload can outlast the 3s interaction deadline
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    count = await repository.reload_schedules()
+    await reconcile_now(interaction.client)
+    await interaction.followup.send(f"Reloaded {count} schedule(s) from the database.", ephemeral=True)
+
+
+@bot.tree.command(name="metrics", description="Admin: scheduler, database and role API timings", guilds=command_guilds)
+@app_commands.default_permissions(administrator=True)
+async def metrics_slash(interaction: discord.Interaction):
+    """Summarize the in-process metrics (the same numbers /metrics serves over HTTP)."""
+    lines = ["**Scheduler**"]
+    for mode in ("poll", "event"):
+        last = TICK_LAST_SECONDS.get(mode=mode)
+        if last is not None:
+            drift = TICK_DRIFT_SECONDS.get(mode=mode) or 0.0
+            lines.append(
+                f"   {mode}: last tick {last * 1000:.1f}ms, drift {drift:.2f}s, {TICKS_OVER_BUDGET.get(mode=mode)} over budget"
+            )
+    lines.append(f"   Active users: {ACTIVE_USERS.get() or 0}")
+    lines.append(f"   Event loop lag: {(LOOP_LAG_SECONDS.get() or 0.0) * 1000:.1f}ms, {LOOP_STALLS.total()} stall(s)")
+
+    lines.append("**Database**")
+    for labels in sorted(DB_QUERY_SECONDS.label_sets(), key=lambda l: l["function"]):
+        count, total, p95 = DB_QUERY_SECONDS.stats(**labels)
+        lines.append(f"   `{labels['function']}`: {count} calls, mean {total / count * 1000:.2f}ms, p95 ≤ {p95 * 1000:.0f}ms")
+
+    stats = role_executor_stats()
+    ok = ROLE_API_CALLS.get(action="add", outcome="ok") + ROLE_API_CALLS.get(action="remove", outcome="ok")
+    lines.append("**Role API**")
+    lines.append(f"   {ROLE_API_CALLS.total()} calls, {ROLE_API_CALLS.total() - ok} not OK (incl. retried)")
+    lines.append(
+        f"   Queue: {stats['queue_depth']} queued, {stats['in_flight']} in flight, "
+        f"p50 {stats['latency_p50']:.2f}s, p95 {stats['latency_p95']:.2f}s, {stats['failed']} failed"
+    )
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+
+@bot.tree.command(name="profileticks", description="Admin: profile the next scheduler ticks to find slow code", guilds=command_guilds)
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(ticks="How many ticks to profile; 0 stops")
+async def profileticks_slash(interaction: discord.Interaction, ticks: app_commands.Range[int, 0, 100] = 5):
+    """Run the next N ticks under cProfile; each one is written to PROFILE_DIR on the bot's host."""
+    left = tick_watchdog.profiling_left
+    tick_watchdog.profile_next(ticks)
+    if ticks:
+        msg = f"Profiling the next {ticks} scheduler tick(s); reports go to `{PROFILE_DIR}/` on the bot's host."
+    else:
+        msg = f"Profiling stopped ({left} tick(s) were left)."
+    if tick_watchdog.last_capture:
+        msg += f"\nLatest capture: `{tick_watchdog.last_capture}`"
+    await interaction.response.send_message(msg, ephemeral=True)
+
+
+@bot.tree.command(name="setrole", description="Admin: choose the role this bot manages on this server", guilds=command_guilds)
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(role="Role to give members while they are on shift")
+async def setrole_slash(interaction: discord.Interaction, role: discord.Role):
+    """Store this server's role choice; the next reconciliation uses it."""
+    # The bot removes this role from everyone off shift, so it must be one it can and should manage
+    if role.is_default():
+        await interaction.response.send_message("@everyone can't be the shift role.", ephemeral=True)
+        return
+    if role.managed:
+        await interaction.response.send_message(f"**{role.name}** is managed by an integration and can't be assigned by hand.", ephemeral=True)
+        return
+    me = interaction.guild.me
+    if me is not None and me.top_role <= role:
+        await interaction.response.send_message(
+            f"**{role.name}** must be below the bot's role in Server Settings → Roles; drag it down, then try again.", ephemeral=True
+        )
+        return
+    await repository.set_role(interaction.guild_id, role.id, role.name)
+    await reconcile_now(interaction.client, interaction.guild_id)
+    await interaction.response.send_message(f"This server's shift role is now **{role.name}**.", ephemeral=True)
+
+
+def _command_tree_hash(guild) -> str:
+    """Fingerprint of what tree.sync would send for this guild (and this application)."""
+    payload = sorted((cmd.to_dict(bot.tree) for cmd in bot.tree.get_commands(guild=guild)), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps([bot.application_id, payload], sort_keys=True).encode()).hexdigest()
+
+
+async def sync_commands():
+    """Sync each guild's slash commands, skipping the REST call when they match the last sync."""
+    for guild in command_guilds:
+        tree_hash = _command_tree_hash(guild)
+        if not FORCE_COMMAND_SYNC and await repository.get_command_hash(guild.id) == tree_hash:
+            logger.info(f"Slash commands for guild {guild.id} unchanged; skipping sync")
+            continue
+        try:
+            await bot.tree.sync(guild=guild)  # sync to each server so slash commands show up
+        except discord.HTTPException as e:
+            # e.g. 403 Missing Access after the bot was removed; the other guilds are still served,
+            # and no hash is stored so the next start tries this one again
+            logger.warning(f"Could not sync slash commands to guild {guild.id}: {e}")
+            continue
+        await repository.set_command_hash(guild.id, tree_hash)
+        logger.info(f"Synced slash commands to guild {guild.id}")
+
+
+@bot.event
+async def setup_hook():
+    # Runs once per process, after login and before the gateway connects; on_ready
+    # fires again on every reconnect, so nothing that must happen once belongs there
+    if METRICS_PORT:
+        await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    start_loop_lag_probe()
+    await schedule_commands.register_schedule_commands(bot.tree, GUILD_IDS)
+    await sick_commands.register_sick_commands(bot.tree, GUILD_IDS)
+    await roster_commands.register_roster_commands(bot.tree, GUILD_IDS)
+    await sync_commands()
+    start_scheduler(bot)  # plans from the in-memory store now, applies roles once ready
+
+
 @bot.event
 async def on_ready():
-    print(f"Logged in as {bot.user}")
-    guild = discord.Object(id=GUILD_ID)
-    await schedule_commands.register_schedule_commands(bot.tree, GUILD_ID)
-    await sick_commands.register_sick_commands(bot.tree, GUILD_ID)
-    await bot.tree.sync(guild=guild)  # sync to your server so slash commands show up
-    start_scheduler(bot)  # start scheduler
\ No newline at end of file
+    logger.info(f"Logged in as {bot.user}")
+
+
+# Member events: fix one member as soon as their role drifts from their schedule,
+# instead of waiting for the next full sweep
+
+@bot.event
+async def on_member_update(before, after):
+    if before.roles != after.roles:  # role changes by the bot itself already match and queue nothing
+        wanted = check_member(bot, after)
+        if wanted is not None:
+            logger.info(f"[Drift] {after} in {after.guild.name}: role changed by hand; {'re-adding' if wanted else 'removing'} it")
+
+
+@bot.event
+async def on_member_join(member):
+    # A scheduled member who left and came back lost their roles
+    if check_member(bot, member):
+        logger.info(f"[Drift] {member} rejoined {member.guild.name} during their shift; re-adding role")
+
+
+@bot.event
+async def on_member_remove(member):
+    forget_member(member.guild.id, member.id)
@@ -0,0 +1,69 @@
+import io
+import discord
+from typing import Literal
+from discord import app_commands
+from app.db import repository
+from app.scheduler.scheduler import reconcile_now
+from app.services.roster import RosterError, export_roster, parse_roster
+
+# Errors listed back to the admin; the rest are summarized as a count
+MAX_ERRORS_SHOWN = 15
+
+def _format_errors(errors):
+    shown = "\n".join(f"- {e}" for e in errors[:MAX_ERRORS_SHOWN])
+    if len(errors) > MAX_ERRORS_SHOWN:
+        shown += f"\n... and {len(errors) - MAX_ERRORS_SHOWN} more"
+    return shown
+
+def _format_of(filename: str, requested: str | None) -> str:
+    if requested:
+        return requested
+    return "json" if filename.lower().endswith((".json", ".jsonl")) else "csv"
+
+async def register_roster_commands(tree, guild_ids):
+    guilds = [discord.Object(id=guild_id) for guild_id in guild_ids]
+
+    @tree.command(name="importschedules", description="Admin: add or update many schedules from a CSV or JSON roster", guilds=guilds)
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(
+        roster="CSV with columns user_id,start,end,days[,timezone], or JSON objects with the same keys",
+        format="csv or json (default: from the file name)",
+        skip_invalid="Import the valid rows even if some are invalid",
+    )
+    async def importschedules(
+        interaction,
+        roster: discord.Attachment,
+        format: Literal["csv", "json"] | None = None,
+        skip_invalid: bool = False,
+    ):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            text = (await roster.read()).decode("utf-8-sig")
+        except UnicodeDecodeError:
+            await interaction.followup.send("The roster must be UTF-8 text.", ephemeral=True)
+            return
+        try:
+            rows, errors = parse_roster(text, _format_of(roster.filename, format), skip_invalid)
+        except RosterError as e:
+            await interaction.followup.send(
+                f"Nothing imported: {e}.\n{_format_errors(e.errors)}\nFix them, or re-run with `skip_invalid`.", ephemeral=True
+            )
+            return
+        count = await repository.upsert_schedules(interaction.guild_id, rows)
+        await reconcile_now(interaction.client, interaction.guild_id)
+        msg = f"Imported {count} schedule(s)."
+        if errors:
+            msg += f" Skipped {len(errors)} invalid row(s):\n{_format_errors(errors)}"
+        await interaction.followup.send(msg, ephemeral=True)
+
+    @tree.command(name="exportschedules", description="Admin: download this server's schedules as a roster", guilds=guilds)
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(format="csv or json")
+    async def exportschedules(interaction, format: Literal["csv", "json"] = "csv"):
+        rows = await repository.get_guild_schedules(interaction.guild_id)
+        data = export_roster(rows, format).encode()
+        await interaction.response.send_message(
+            f"{len(rows)} schedule(s).",
+            file=discord.File(io.BytesIO(data), filename=f"schedules-{interaction.guild_id}.{format}"),
+            ephemeral=True,
+        )
@@ -1,12 +1,24 @@
 import discord
 from discord import app_commands
-from app.db.schedule import insert_or_update_schedule, get_schedule, update_days
-from app.utils.time_utils import parse_days_input, format_days_display
+from app.db import repository
+from datetime import datetime, timezone
+from app.utils.time_utils import (
+    parse_days_input,
+    parse_time_input,
+    days_to_mask,
+    format_days_display,
+    format_timedelta,
+    minutes_to_time_str,
+    get_tz,
+)
+from app.scheduler.scheduler import reschedule_user
+from app.services.roster import DEFAULT_TIMEZONE
+from app.services.snapshot import get_snapshot
 
-async def register_schedule_commands(tree, GUILD_ID):
-    guild = discord.Object(id=GUILD_ID)
+async def register_schedule_commands(tree, guild_ids):
+    guilds = [discord.Object(id=guild_id) for guild_id in guild_ids]
 
-    @tree.command(name="setwork", description="Set your work schedule", guild=guild)
+    @tree.command(name="setwork", description="Set your work schedule", guilds=guilds)
     @app_commands.describe(
         start="Start time (e.g. 09:00)",
         end="End time (e.g. 17:00)",
@@ -14,20 +26,30 @@ async def register_schedule_commands(tree, GUILD_ID):
     )
     async def setwork(interaction, start: str, end: str, days: str = "mon,tue,wed,thu,fri"):
         try:
+            start_min = parse_time_input(start)
+            end_min = parse_time_input(end)
             days_stored = parse_days_input(days)
         except ValueError as e:
             await interaction.response.send_message(str(e), ephemeral=True)
             return
-        insert_or_update_schedule(interaction.user.id, "Australia/Sydney", start, end, days_stored)
+        # Times are in the member's existing zone (e.g. from a roster import), else the default
+        row = await repository.get_schedule(interaction.guild_id, interaction.user.id)
+        tz_name = row["timezone"] if row else DEFAULT_TIMEZONE
+        await repository.insert_or_update_schedule(
+            interaction.guild_id, interaction.user.id, tz_name, start_min, end_min, days_to_mask(days_stored)
+        )
+        await reschedule_user(interaction.guild_id, interaction.user.id)
         days_display = format_days_display(days_stored)
-        await interaction.response.send_message(f"Schedule saved: {start}–{end} on {days_display}.")
+        await interaction.response.send_message(
+            f"Schedule saved: {minutes_to_time_str(start_min)}–{minutes_to_time_str(end_min)} on {days_display} ({tz_name})."
+        )
 
-    @tree.command(name="setdays", description="Change which days you work (keeps your start/end times)", guild=guild)
+    @tree.command(name="setdays", description="Change which days you work (keeps your start/end times)", guilds=guilds)
     @app_commands.describe(
         days="Work days: comma-separated, e.g. mon,tue,wed,thu,fri or 0,1,2,3,4 (0=Mon, 6=Sun)",
     )
     async def setdays(interaction, days: str):
-        row = get_schedule(interaction.user.id)
+        row = await repository.get_schedule(interaction.guild_id, interaction.user.id)
         if not row:
             await interaction.response.send_message("Set your schedule first with `/setwork start end days`.", ephemeral=True)
             return
@@ -36,18 +58,28 @@ async def register_schedule_commands(tree, GUILD_ID):
         except ValueError as e:
             await interaction.response.send_message(str(e), ephemeral=True)
             return
-        update_days(interaction.user.id, days_stored)
+        await repository.update_days(interaction.guild_id, interaction.user.id, days_to_mask(days_stored))
+        await reschedule_user(interaction.guild_id, interaction.user.id)
         days_display = format_days_display(days_stored)
         await interaction.response.send_message(f"Work days updated to: {days_display}.")
 
-    @tree.command(name="myschedule", description="View your schedule", guild=guild)
+    @tree.command(name="myschedule", description="View your schedule", guilds=guilds)
     async def myschedule(interaction):
-        row = get_schedule(interaction.user.id)
+        row = await repository.get_schedule(interaction.guild_id, interaction.user.id)
         if not row:
             await interaction.response.send_message("No schedule set.")
             return
-        status = "Sick until " + row["sick_until"] if row["sick_until"] else "Active"
-        days_display = format_days_display(row["days"])
+        status = "Active"
+        if row["sick_until"]:
+            sick_until = datetime.fromtimestamp(row["sick_until"], timezone.utc).astimezone(get_tz(row["timezone"]))
+            status = "Sick until " + sick_until.strftime("%Y-%m-%d %H:%M")
+        days_display = format_days_display(row["days_mask"])
+        snapshot = await get_snapshot()
+        role = "on shift" if snapshot.is_active(interaction.guild_id, interaction.user.id) else "off shift"
+        _, next_utc = snapshot.next_change(interaction.guild_id, interaction.user.id) or (False, None)
+        if next_utc:
+            role += f", next change in {format_timedelta(next_utc - datetime.now(timezone.utc))}"
         await interaction.response.send_message(
-            f"Times are Australia/Sydney.\nStart: {row['start_time']}\nEnd: {row['end_time']}\nDays: {days_display}\nStatus: {status}"
+            f"Times are {row['timezone']}.\nStart: {minutes_to_time_str(row['start_min'])}\nEnd: {minutes_to_time_str(row['end_min'])}\nDays: {days_display}\nStatus: {status}"
+            f"\nRole: {role} (as of {snapshot.taken_at.strftime('%H:%M:%S')} UTC)"
         )
\ No newline at end of file
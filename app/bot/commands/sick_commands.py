@@ -1,18 +1,22 @@
 import discord
 from discord import app_commands
-from app.db.schedule import update_sick
-from datetime import datetime, timedelta
+from app.db import repository
+from app.scheduler.scheduler import reschedule_user
+import math
+from datetime import datetime, timedelta, timezone
 
-async def register_sick_commands(tree, GUILD_ID):
-    guild = discord.Object(id=GUILD_ID)
+async def register_sick_commands(tree, guild_ids):
+    guilds = [discord.Object(id=guild_id) for guild_id in guild_ids]
 
-    @tree.command(name="sick", description="Mark yourself sick", guild=guild)
+    @tree.command(name="sick", description="Mark yourself sick", guilds=guilds)
     async def sick(interaction, hours: int):
-        until = datetime.utcnow() + timedelta(hours=hours)
-        update_sick(interaction.user.id, until.isoformat())
+        until = datetime.now(timezone.utc) + timedelta(hours=hours)
+        await repository.update_sick(interaction.guild_id, interaction.user.id, math.ceil(until.timestamp()))
+        await reschedule_user(interaction.guild_id, interaction.user.id)
         await interaction.response.send_message(f"Sick for {hours} hours")
 
-    @tree.command(name="back", description="Return from sick", guild=guild)
+    @tree.command(name="back", description="Return from sick", guilds=guilds)
     async def back(interaction):
-        update_sick(interaction.user.id, None)
+        await repository.update_sick(interaction.guild_id, interaction.user.id, None)
+        await reschedule_user(interaction.guild_id, interaction.user.id)
         await interaction.response.send_message("You are back from sick")
\ No newline at end of file
@@ -4,6 +4,59 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-GUILD_ID = int(os.getenv("GUILD_ID"))
+# Servers to manage, comma-separated. A single GUILD_ID still works; it is also the
+# server that schedules saved before multi-server support are assigned to.
+GUILD_IDS = [int(g) for g in os.getenv("GUILD_IDS", os.getenv("GUILD_ID", "")).split(",") if g.strip()]
+GUILD_ID = int(os.getenv("GUILD_ID") or GUILD_IDS[0])
+# Default role name; admins can pick a different role per server with /setrole
 ROLE_NAME = os.getenv("ROLE_NAME", "At Work")
-DATABASE_PATH = "schedules.db"
\ No newline at end of file
+DATABASE_PATH = os.getenv("DATABASE_PATH", "schedules.db")
+
+# "poll" re-checks everyone every minute; "event" sleeps until the next shift boundary
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "poll").lower()
+# Minutes between full role sweeps of every guild. Between them only users whose state flipped are
+# touched, and member events correct manual changes right away. 0 sweeps only at startup.
+FULL_RECONCILE_MINUTES = int(os.getenv("FULL_RECONCILE_MINUTES", "15"))
+# Set to 1 to sweep every guild at startup; by default a restart only sends what differs
+# from the role ledger (what was last applied) plus changes that were pending or failed
+STARTUP_AUDIT = os.getenv("STARTUP_AUDIT", "0") == "1"
+
+# Role mutation executor: parallel requests, and per-guild token bucket (requests/second, burst)
+ROLE_CONCURRENCY = int(os.getenv("ROLE_CONCURRENCY", "8"))
+ROLE_RATE_PER_SECOND = float(os.getenv("ROLE_RATE_PER_SECOND", "5"))
+ROLE_RATE_BURST = int(os.getenv("ROLE_RATE_BURST", "5"))
+ROLE_MAX_RETRIES = int(os.getenv("ROLE_MAX_RETRIES", "5"))
+
+# SQLite tuning: page cache size in KiB and prepared statements kept per connection
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "16384"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "128"))
+
+# Database worker threads, and how many queries may be queued before callers wait
+DB_WORKERS = int(os.getenv("DB_WORKERS", "2"))
+DB_QUEUE_SIZE = int(os.getenv("DB_QUEUE_SIZE", "64"))
+
+# How get_active_users() evaluates schedules: "scalar" (pure Python), "numpy" (vectorized, needs numpy)
+# or "index" (minute-of-week index, updated incrementally on schedule writes)
+ACTIVE_USERS_BACKEND = os.getenv("ACTIVE_USERS_BACKEND", "scalar").lower()
+
+# Set to 1 to push slash commands to Discord on every start, even if they look unchanged
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "0") == "1"
+
+# "full" caches every member of each guild at startup (needs more memory on big servers);
+# "lean" skips startup chunking and caches only members who have a schedule, up to MEMBER_CACHE_SIZE per guild
+MEMBER_CACHE = os.getenv("MEMBER_CACHE", "full").lower()
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE", "10000"))
+
+# Gateway shards: unset for a single connection, "auto" for Discord's recommended count, or a number
+SHARD_COUNT = os.getenv("SHARD_COUNT", "").lower()
+
+# Scheduler tick budget in seconds: a slower tick is logged and its stack samples are written to
+# PROFILE_DIR (0 disables). Admins can also profile the next ticks with /profileticks.
+TICK_BUDGET_SECONDS = float(os.getenv("TICK_BUDGET_SECONDS", "5"))
+# Event loop lag in seconds that counts as a stall; the stalled stack is written to PROFILE_DIR (0 disables)
+LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv("LOOP_LAG_THRESHOLD_SECONDS", "0.5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Prometheus-style /metrics endpoint; disabled unless METRICS_PORT is set
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
@@ -0,0 +1,211 @@
+import asyncio
+import functools
+import math
+import threading
+import time
+from app.core.logger import logger
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_str(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _fmt(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def total(self):
+        return sum(self._values.values())
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_fmt(value)}" for key, value in items]
+
+class Gauge(_Metric):
+    """A value that is set directly, or read from a callback at render time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self._callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def get(self, **labels):
+        if self._callback is not None:
+            return self._callback()
+        return self._values.get(self._key(labels))
+
+    def _samples(self):
+        if self._callback is not None:
+            return [f"{self.name} {_fmt(self._callback())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_fmt(value)}" for key, value in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Decorator that observes the wrapped function's duration."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def stats(self, **labels):
+        """(count, sum, approximate p95 upper bound) for one label set."""
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return 0, 0.0, 0.0
+        counts, total, count = state[0][:], state[1], state[2]
+        target, seen = 0.95 * count, 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            if seen >= target:
+                return count, total, bound
+        return count, total, math.inf
+
+    def label_sets(self):
+        with self._lock:
+            return [dict(zip(self.labelnames, key)) for key in self._values]
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            items = [(key, (state[0][:], state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, [('le', _fmt(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+TICK_SECONDS = registry.histogram("workbot_tick_duration_seconds", "Scheduler tick duration.", ["mode"])
+TICK_LAST_SECONDS = registry.gauge("workbot_tick_last_duration_seconds", "Duration of the most recent scheduler tick.", ["mode"])
+TICK_DRIFT_SECONDS = registry.gauge(
+    "workbot_scheduler_drift_seconds", "How late the most recent tick started versus its scheduled wall-clock time.", ["mode"]
+)
+TICKS_OVER_BUDGET = registry.counter("workbot_ticks_over_budget_total", "Scheduler ticks slower than TICK_BUDGET_SECONDS.", ["mode"])
+LOOP_LAG_SECONDS = registry.gauge("workbot_event_loop_lag_seconds", "How late the loop-lag probe last woke up.")
+LOOP_STALLS = registry.counter("workbot_event_loop_stalls_total", "Event loop stalls longer than LOOP_LAG_THRESHOLD_SECONDS.")
+DB_QUERY_SECONDS = registry.histogram("workbot_db_query_seconds", "Time spent in database functions.", ["function"])
+ROLE_API_CALLS = registry.counter("workbot_role_api_calls_total", "Role add/remove HTTP calls by outcome.", ["action", "outcome"])
+ROLE_API_SECONDS = registry.histogram("workbot_role_api_seconds", "Role add/remove HTTP call latency.", ["action"])
+ACTIVE_USERS = registry.gauge("workbot_active_users", "Users who should hold the role as of the last tick.")
+
+async def _handle_http(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(host: str, port: int):
+    """Serve GET /metrics on host:port. Call from inside the running event loop."""
+    server = await asyncio.start_server(_handle_http, host, port)
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
@@ -1,23 +1,45 @@
 import sqlite3
-from app.core.config import DATABASE_PATH
+import threading
+from app.core.config import DATABASE_PATH, SQLITE_CACHE_KB, SQLITE_STATEMENT_CACHE
+from app.db.migrations import migrate
 
-def get_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
+# One long-lived connection per thread; WAL lets readers run alongside a writer
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+def _connect():
+    conn = sqlite3.connect(DATABASE_PATH, cached_statements=SQLITE_STATEMENT_CACHE, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL; fsync only at checkpoints
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+def get_connection():
+    """Return this thread's persistent connection, opening it on first use. Do not close it."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
+        with _connections_lock:
+            _connections.append(conn)
     return conn
 
+def close_connections():
+    """Shutdown hook: close every connection opened by get_connection()."""
+    global _local
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+    _local = threading.local()
+
 def init_db():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS schedules (
-            user_id INTEGER PRIMARY KEY,
-            timezone TEXT NOT NULL,
-            start_time TEXT NOT NULL,
-            end_time TEXT NOT NULL,
-            days TEXT NOT NULL,
-            sick_until TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    """Create or upgrade the schema to the latest version."""
+    migrate(get_connection())
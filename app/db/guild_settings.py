@@ -0,0 +1,50 @@
+import threading
+from app.core.config import ROLE_NAME
+from app.core.metrics import DB_QUERY_SECONDS
+from app.db.database import get_connection
+
+_SELECT_ALL = "SELECT guild_id, role_name, role_id FROM guild_settings"
+_UPSERT_ROLE = """
+    INSERT INTO guild_settings (guild_id, role_name, role_id) VALUES (?, ?, ?)
+    ON CONFLICT(guild_id) DO UPDATE SET role_name=excluded.role_name, role_id=excluded.role_id
+"""
+_SELECT_COMMAND_HASH = "SELECT tree_hash FROM command_sync WHERE guild_id=?"
+_UPSERT_COMMAND_HASH = "INSERT OR REPLACE INTO command_sync (guild_id, tree_hash) VALUES (?, ?)"
+
+# guild_id -> (role_id, role_name); the table is tiny and read on every reconciliation, so it lives in memory
+_roles = {}
+_write_lock = threading.Lock()
+
+@DB_QUERY_SECONDS.time(function="load_guild_settings")
+def load_guild_settings():
+    global _roles
+    with _write_lock:
+        _roles = {row["guild_id"]: (row["role_id"], row["role_name"]) for row in get_connection().execute(_SELECT_ALL)}
+    return len(_roles)
+
+def get_role_id(guild_id) -> int | None:
+    """ID of the role picked with /setrole in this guild, or None to match by name."""
+    return _roles.get(guild_id, (None, None))[0]
+
+def get_role_name(guild_id) -> str:
+    """Name of the role managed in this guild: its /setrole choice (as it was named then), or ROLE_NAME."""
+    return _roles.get(guild_id, (None, ROLE_NAME))[1]
+
+@DB_QUERY_SECONDS.time(function="set_role")
+def set_role(guild_id, role_id, role_name):
+    global _roles
+    conn = get_connection()
+    with _write_lock:
+        with conn:
+            conn.execute(_UPSERT_ROLE, (guild_id, role_name, role_id))
+        _roles = {**_roles, guild_id: (role_id, role_name)}
+
+def get_command_hash(guild_id) -> str | None:
+    """Hash of the command tree last synced to this guild, or None if never synced."""
+    row = get_connection().execute(_SELECT_COMMAND_HASH, (guild_id,)).fetchone()
+    return row["tree_hash"] if row else None
+
+def set_command_hash(guild_id, tree_hash):
+    conn = get_connection()
+    with conn:
+        conn.execute(_UPSERT_COMMAND_HASH, (guild_id, tree_hash))
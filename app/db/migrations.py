@@ -0,0 +1,155 @@
+from app.core.config import GUILD_ID
+from app.core.logger import logger
+from app.utils.time_utils import time_to_minutes, days_to_mask, sick_until_to_epoch
+
+def _v1_text_schedules(conn):
+    """The original layout: times as 'HH:MM', days as '0,1,2', sick_until as ISO text."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schedules (
+            user_id INTEGER PRIMARY KEY,
+            timezone TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            days TEXT NOT NULL,
+            sick_until TEXT
+        )
+    """)
+
+def _v2_typed_schedules(conn):
+    """Integer minute-of-day, weekday bitmask and epoch sick_until, converted in place."""
+    conn.execute("""
+        CREATE TABLE schedules_v2 (
+            user_id INTEGER PRIMARY KEY,
+            timezone TEXT NOT NULL,
+            start_min INTEGER NOT NULL CHECK (start_min BETWEEN 0 AND 1439),
+            end_min INTEGER NOT NULL CHECK (end_min BETWEEN 0 AND 1439),
+            days_mask INTEGER NOT NULL CHECK (days_mask BETWEEN 1 AND 127),
+            sick_until INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schedules_unmigrated (
+            user_id INTEGER PRIMARY KEY,
+            timezone TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            days TEXT,
+            sick_until TEXT,
+            error TEXT
+        )
+    """)
+
+    converted = []
+    for row in conn.execute("SELECT * FROM schedules"):
+        try:
+            converted.append((
+                row["user_id"],
+                row["timezone"],
+                time_to_minutes(row["start_time"]),
+                time_to_minutes(row["end_time"]),
+                days_to_mask(row["days"]),
+                sick_until_to_epoch(row["sick_until"]),
+            ))
+        except (ValueError, TypeError) as e:
+            logger.warning(f"[DB] Could not migrate schedule for user {row['user_id']}: {e}. Kept in schedules_unmigrated.")
+            conn.execute(
+                "INSERT OR REPLACE INTO schedules_unmigrated VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*tuple(row), str(e)),
+            )
+    conn.executemany("INSERT INTO schedules_v2 VALUES (?, ?, ?, ?, ?, ?)", converted)
+
+    conn.execute("DROP TABLE schedules")
+    conn.execute("ALTER TABLE schedules_v2 RENAME TO schedules")
+    # Only sick users are indexed, so "whose sickness expired" stays cheap; "who works today"
+    # searches the days_mask index with an IN list of masks
+    conn.execute("CREATE INDEX idx_schedules_sick_until ON schedules(sick_until) WHERE sick_until IS NOT NULL")
+    conn.execute("CREATE INDEX idx_schedules_days_start ON schedules(days_mask, start_min)")
+
+def _v3_guild_schedules(conn):
+    """Key schedules by (guild_id, user_id); existing rows belong to GUILD_ID. Adds per-guild settings."""
+    conn.execute("""
+        CREATE TABLE schedules_v3 (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            timezone TEXT NOT NULL,
+            start_min INTEGER NOT NULL CHECK (start_min BETWEEN 0 AND 1439),
+            end_min INTEGER NOT NULL CHECK (end_min BETWEEN 0 AND 1439),
+            days_mask INTEGER NOT NULL CHECK (days_mask BETWEEN 1 AND 127),
+            sick_until INTEGER,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    """)
+    conn.execute(
+        "INSERT INTO schedules_v3 SELECT ?, user_id, timezone, start_min, end_min, days_mask, sick_until FROM schedules",
+        (GUILD_ID,),
+    )
+    conn.execute("DROP TABLE schedules")
+    conn.execute("ALTER TABLE schedules_v3 RENAME TO schedules")
+    conn.execute("CREATE INDEX idx_schedules_sick_until ON schedules(sick_until) WHERE sick_until IS NOT NULL")
+    conn.execute("CREATE INDEX idx_schedules_days_start ON schedules(days_mask, start_min)")
+
+    conn.execute("""
+        CREATE TABLE guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            role_name TEXT NOT NULL,
+            role_id INTEGER
+        )
+    """)
+
+def _v4_command_sync(conn):
+    """Hash of the slash commands last synced to each guild, so unchanged trees skip the REST call."""
+    conn.execute("""
+        CREATE TABLE command_sync (
+            guild_id INTEGER PRIMARY KEY,
+            tree_hash TEXT NOT NULL
+        )
+    """)
+
+def _v5_role_ledger(conn):
+    """What the bot last applied per member, so a restart only retries what didn't finish."""
+    conn.execute("""
+        CREATE TABLE role_ledger (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            has_role INTEGER NOT NULL,
+            applied_at INTEGER,
+            pending INTEGER,
+            status TEXT NOT NULL CHECK (status IN ('ok', 'pending', 'failed')),
+            PRIMARY KEY (guild_id, user_id)
+        )
+    """)
+    # Only unfinished operations are indexed; they are what a restart looks for
+    conn.execute("CREATE INDEX idx_role_ledger_status ON role_ledger(guild_id, status) WHERE status != 'ok'")
+
+# (version, migration); append new ones, never edit applied ones
+MIGRATIONS = [
+    (1, _v1_text_schedules),
+    (2, _v2_typed_schedules),
+    (3, _v3_guild_schedules),
+    (4, _v4_command_sync),
+    (5, _v5_role_ledger),
+]
+
+def get_schema_version(conn) -> int:
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def migrate(conn):
+    """Apply every migration newer than the database, each in its own transaction."""
+    current = get_schema_version(conn)
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration(conn)
+            conn.execute("DELETE FROM schema_version")
+            conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"[DB] Migrated schema to version {version}")
+        current = version
+    return current
@@ -1,8 +1,48 @@
 # just define constants for table/column names
+TABLE_SCHEMA_VERSION = "schema_version"
+COL_VERSION = "version"
+
+# schedules (schema version 3), primary key (guild_id, user_id)
+#   guild_id   INTEGER  Discord server the schedule applies to
+#   user_id    INTEGER
+#   timezone   TEXT     IANA zone name, e.g. "Australia/Sydney"
+#   start_min  INTEGER  minutes since local midnight, 0-1439
+#   end_min    INTEGER  minutes since local midnight, 0-1439; end < start is an overnight shift
+#   days_mask  INTEGER  bit 0 = Monday ... bit 6 = Sunday, 1-127
+#   sick_until INTEGER  epoch seconds (UTC), NULL when not sick
 TABLE_SCHEDULES = "schedules"
+COL_GUILD_ID = "guild_id"
 COL_USER_ID = "user_id"
 COL_TIMEZONE = "timezone"
-COL_START = "start_time"
-COL_END = "end_time"
-COL_DAYS = "days"
-COL_SICK = "sick_until"
\ No newline at end of file
+COL_START = "start_min"
+COL_END = "end_min"
+COL_DAYS = "days_mask"
+COL_SICK = "sick_until"
+
+# Rows that could not be converted by the version 2 migration, kept verbatim
+TABLE_SCHEDULES_UNMIGRATED = "schedules_unmigrated"
+
+# guild_settings: per-server configuration
+#   guild_id   INTEGER PRIMARY KEY
+#   role_name  TEXT     role to manage in that server (default ROLE_NAME)
+#   role_id    INTEGER  that role's ID when picked with /setrole, NULL to match by name
+TABLE_GUILD_SETTINGS = "guild_settings"
+COL_ROLE_NAME = "role_name"
+COL_ROLE_ID = "role_id"
+
+# command_sync: what was last pushed with tree.sync, per guild
+#   guild_id   INTEGER PRIMARY KEY
+#   tree_hash  TEXT     sha256 of the guild's command payloads
+TABLE_COMMAND_SYNC = "command_sync"
+COL_TREE_HASH = "tree_hash"
+
+# role_ledger: role state the bot applied per member (schema version 5), primary key (guild_id, user_id)
+#   has_role    INTEGER  1 if the member holds the managed role, as last applied or observed
+#   applied_at  INTEGER  epoch seconds (UTC) of the last successful change, NULL if only observed
+#   pending     INTEGER  state being applied while status is pending or failed, else NULL
+#   status      TEXT     "ok", "pending" (sent, outcome unknown) or "failed"
+TABLE_ROLE_LEDGER = "role_ledger"
+COL_HAS_ROLE = "has_role"
+COL_APPLIED_AT = "applied_at"
+COL_PENDING = "pending"
+COL_STATUS = "status"
@@ -0,0 +1,84 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import DB_WORKERS, DB_QUEUE_SIZE
+from app.db import guild_settings, role_ledger, schedule
+from app.db.schedule_store import schedule_store
+
+# Async access to the schedule tables. Queries run on dedicated worker threads
+# (each with its own persistent connection) so SQLite never blocks the event loop.
+
+_pool: ThreadPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+_slots_loop = None
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+    return _pool
+
+def _get_slots():
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots_loop is not loop:
+        _slots = asyncio.Semaphore(DB_QUEUE_SIZE)
+        _slots_loop = loop
+    return _slots
+
+async def run(fn, *args):
+    """Run fn(*args) on a database worker thread. Waits while DB_QUEUE_SIZE calls are pending."""
+    async with _get_slots():
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), functools.partial(fn, *args))
+
+async def insert_or_update_schedule(guild_id, user_id, timezone, start_min, end_min, days_mask):
+    await run(schedule.insert_or_update_schedule, guild_id, user_id, timezone, start_min, end_min, days_mask)
+
+async def get_schedule(guild_id, user_id):
+    if schedule_store.loaded:
+        return schedule_store.get(guild_id, user_id)  # in memory, no thread hop
+    return await run(schedule.get_schedule, guild_id, user_id)
+
+async def update_sick(guild_id, user_id, sick_until):
+    await run(schedule.update_sick, guild_id, user_id, sick_until)
+
+async def clear_expired_sickness(now_ts):
+    return await run(schedule.clear_expired_sickness, now_ts)
+
+async def update_days(guild_id, user_id, days_mask):
+    await run(schedule.update_days, guild_id, user_id, days_mask)
+
+async def upsert_schedules(guild_id, rows):
+    return await run(schedule.upsert_schedules, guild_id, rows)
+
+async def get_guild_schedules(guild_id):
+    return await run(schedule.get_guild_schedules, guild_id)
+
+async def get_all_schedules():
+    return await run(schedule.get_all_schedules)
+
+async def reload_schedules():
+    return await run(schedule.load_schedule_store)
+
+async def set_role(guild_id, role_id, role_name):
+    await run(guild_settings.set_role, guild_id, role_id, role_name)
+    await run(role_ledger.clear_guild, guild_id)  # it described the previous role
+
+async def mark_pending(guild_id, changes):
+    await run(role_ledger.mark_pending, guild_id, changes)
+
+async def record_roles(guild_id, applied=None, observed=None, failed=(), absent=()):
+    await run(role_ledger.record_roles, guild_id, applied, observed, failed, absent)
+
+async def get_command_hash(guild_id):
+    return await run(guild_settings.get_command_hash, guild_id)
+
+async def set_command_hash(guild_id, tree_hash):
+    await run(guild_settings.set_command_hash, guild_id, tree_hash)
+
+def shutdown():
+    """Wait for queued queries to finish and stop the worker threads."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
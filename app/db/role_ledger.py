@@ -0,0 +1,103 @@
+import threading
+import time
+from app.core.metrics import DB_QUERY_SECONDS
+from app.db.database import get_connection
+
+_SELECT_ALL = "SELECT guild_id, user_id, has_role, status FROM role_ledger"
+_UPSERT_PENDING = """
+    INSERT INTO role_ledger (guild_id, user_id, has_role, pending, status) VALUES (?, ?, ?, ?, 'pending')
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET pending=excluded.pending, status='pending'
+"""
+_UPSERT_OK = """
+    INSERT INTO role_ledger (guild_id, user_id, has_role, applied_at, pending, status) VALUES (?, ?, ?, ?, NULL, 'ok')
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        has_role=excluded.has_role, applied_at=COALESCE(excluded.applied_at, applied_at), pending=NULL, status='ok'
+"""
+_UPDATE_FAILED = "UPDATE role_ledger SET status='failed' WHERE guild_id=? AND user_id=?"
+_DELETE_MEMBER = "DELETE FROM role_ledger WHERE guild_id=? AND user_id=?"
+_DELETE_GUILD = "DELETE FROM role_ledger WHERE guild_id=?"
+
+# guild_id -> {user_id: (has_role, status)}. Read on the event loop and replaced
+# per guild (never mutated in place) by writers on the DB worker threads.
+_ledger = {}
+_write_lock = threading.Lock()
+
+@DB_QUERY_SECONDS.time(function="load_role_ledger")
+def load_role_ledger():
+    global _ledger
+    ledger = {}
+    for row in get_connection().execute(_SELECT_ALL):
+        ledger.setdefault(row["guild_id"], {})[row["user_id"]] = (bool(row["has_role"]), row["status"])
+    with _write_lock:
+        _ledger = ledger
+    return sum(len(entries) for entries in ledger.values())
+
+def known_guild(guild_id) -> bool:
+    """Whether the bot has applied or observed anything in this guild before."""
+    return guild_id in _ledger
+
+def holders(guild_id) -> set[int]:
+    """Members the ledger says hold the managed role, including unfinished removals."""
+    return {user_id for user_id, (has_role, _) in _ledger.get(guild_id, {}).items() if has_role}
+
+def unsettled(guild_id) -> list[int]:
+    """Members with a pending (sent, outcome unknown) or failed role change."""
+    return [user_id for user_id, (_, status) in _ledger.get(guild_id, {}).items() if status != "ok"]
+
+@DB_QUERY_SECONDS.time(function="mark_pending")
+def mark_pending(guild_id, changes):
+    """Record role changes (user_id -> should_have_role) about to be sent, before sending them."""
+    if not changes:
+        return
+    conn = get_connection()
+    with _write_lock:
+        entries = dict(_ledger.get(guild_id, {}))
+        with conn:
+            conn.executemany(_UPSERT_PENDING, [(guild_id, user_id, not want, want) for user_id, want in changes.items()])
+        for user_id, want in changes.items():
+            has_role = entries[user_id][0] if user_id in entries else not want
+            entries[user_id] = (has_role, "pending")
+        _ledger[guild_id] = entries
+
+@DB_QUERY_SECONDS.time(function="record_roles")
+def record_roles(guild_id, applied=None, observed=None, failed=(), absent=()):
+    """
+    Settle ledger entries after a pass. applied maps user_id -> has_role for
+    changes Discord accepted; observed does the same for states seen in the
+    member cache without a request (only differences are written); failed
+    lists user_ids whose change gave up; absent lists user_ids no longer in
+    the guild, whose entries are dropped.
+    """
+    now = int(time.time())
+    conn = get_connection()
+    with _write_lock:
+        entries = dict(_ledger.get(guild_id, {}))
+        ok = [(guild_id, user_id, has_role, now) for user_id, has_role in (applied or {}).items()]
+        ok += [
+            (guild_id, user_id, has_role, None)
+            for user_id, has_role in (observed or {}).items()
+            if entries.get(user_id, (False, "ok")) != (has_role, "ok")
+        ]
+        failed = [user_id for user_id in failed if user_id in entries]
+        absent = [user_id for user_id in absent if user_id in entries]
+        if not ok and not failed and not absent:
+            return
+        with conn:
+            conn.executemany(_UPSERT_OK, ok)
+            conn.executemany(_UPDATE_FAILED, [(guild_id, user_id) for user_id in failed])
+            conn.executemany(_DELETE_MEMBER, [(guild_id, user_id) for user_id in absent])
+        for _, user_id, has_role, _ in ok:
+            entries[user_id] = (bool(has_role), "ok")
+        for user_id in failed:
+            entries[user_id] = (entries[user_id][0], "failed")
+        for user_id in absent:
+            del entries[user_id]
+        _ledger[guild_id] = entries
+
+def clear_guild(guild_id):
+    """Forget a guild's ledger, e.g. when it starts managing a different role."""
+    conn = get_connection()
+    with _write_lock:
+        with conn:
+            conn.execute(_DELETE_GUILD, (guild_id,))
+        _ledger.pop(guild_id, None)
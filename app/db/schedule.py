@@ -1,50 +1,180 @@
+import threading
+from app.core.metrics import DB_QUERY_SECONDS
 from app.db.database import get_connection
+from app.db.schedule_store import schedule_store
+from app.utils.time_utils import compile_schedule
 
-def insert_or_update_schedule(user_id, timezone, start, end, days):
+# Statements are module constants so sqlite3's per-connection cache reuses them
+_UPSERT_SCHEDULE = """
+    INSERT OR REPLACE INTO schedules
+    (guild_id, user_id, timezone, start_min, end_min, days_mask, sick_until)
+    VALUES (?, ?, ?, ?, ?, ?, NULL)
+"""
+_SELECT_SCHEDULE = "SELECT * FROM schedules WHERE guild_id=? AND user_id=?"
+_UPDATE_SICK = """
+    UPDATE schedules
+    SET sick_until=?
+    WHERE guild_id=? AND user_id=?
+"""
+_UPDATE_DAYS = """
+    UPDATE schedules
+    SET days_mask=?
+    WHERE guild_id=? AND user_id=?
+"""
+# Bulk roster import: like _UPSERT_SCHEDULE, but an existing sick_until is kept
+_UPSERT_KEEP_SICK = """
+    INSERT INTO schedules (guild_id, user_id, timezone, start_min, end_min, days_mask)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        timezone=excluded.timezone,
+        start_min=excluded.start_min,
+        end_min=excluded.end_min,
+        days_mask=excluded.days_mask
+"""
+_SELECT_ALL = "SELECT * FROM schedules"
+_SELECT_GUILD = "SELECT * FROM schedules WHERE guild_id=?"
+# days_mask IN (every mask with one of the weekdays' bits), so SQLite can search idx_schedules_days_start;
+# "days_mask & ? != 0" would scan the table
+_SELECT_WORKING_ON = "SELECT * FROM schedules WHERE days_mask IN ({})"
+# Answered from the partial index on sick users
+_SELECT_SICK_EXPIRED = "SELECT guild_id, user_id FROM schedules WHERE sick_until IS NOT NULL AND sick_until <= ?"
+_CLEAR_SICK_EXPIRED = "UPDATE schedules SET sick_until=NULL WHERE sick_until IS NOT NULL AND sick_until <= ?"
+
+# Serializes DB write + store update so the store sees writes in commit order
+_write_lock = threading.Lock()
+
+@DB_QUERY_SECONDS.time(function="insert_or_update_schedule")
+def insert_or_update_schedule(guild_id, user_id, timezone, start_min, end_min, days_mask):
+    """start_min/end_min are minutes since local midnight; days_mask has bit 0 = Monday."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR REPLACE INTO schedules
-        (user_id, timezone, start_time, end_time, days, sick_until)
-        VALUES (?, ?, ?, ?, ?, NULL)
-    """, (user_id, timezone, start, end, days))
-    conn.commit()
-    conn.close()
-
-def get_schedule(user_id):
+    with _write_lock:
+        with conn:
+            conn.execute(_UPSERT_SCHEDULE, (guild_id, user_id, timezone, start_min, end_min, days_mask))
+        schedule_store.put({
+            "guild_id": guild_id,
+            "user_id": user_id,
+            "timezone": timezone,
+            "start_min": start_min,
+            "end_min": end_min,
+            "days_mask": days_mask,
+            "sick_until": None,
+        })
+
+@DB_QUERY_SECONDS.time(function="upsert_schedules")
+def upsert_schedules(guild_id, rows, chunk_size=500):
+    """
+    Bulk insert/update (user_id, timezone, start_min, end_min, days_mask) rows
+    for one guild, keeping each user's sick_until. Each chunk is one
+    executemany transaction, so other writers only ever wait for one chunk.
+    """
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM schedules WHERE user_id=?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        with _write_lock:
+            with conn:
+                conn.executemany(_UPSERT_KEEP_SICK, [(guild_id, *row) for row in chunk])
+            schedule_store.put_many([
+                {
+                    "guild_id": guild_id,
+                    "user_id": user_id,
+                    "timezone": timezone,
+                    "start_min": start_min,
+                    "end_min": end_min,
+                    "days_mask": days_mask,
+                    "sick_until": _current_sick_until(guild_id, user_id),
+                }
+                for user_id, timezone, start_min, end_min, days_mask in chunk
+            ])
+    return len(rows)
+
+def _current_sick_until(guild_id, user_id):
+    row = schedule_store.get(guild_id, user_id)
+    return row["sick_until"] if row else None
 
-def update_sick(user_id, sick_until):
+@DB_QUERY_SECONDS.time(function="get_schedule")
+def get_schedule(guild_id, user_id):
+    if schedule_store.loaded:
+        return schedule_store.get(guild_id, user_id)
+    return get_connection().execute(_SELECT_SCHEDULE, (guild_id, user_id)).fetchone()
+
+@DB_QUERY_SECONDS.time(function="update_sick")
+def update_sick(guild_id, user_id, sick_until):
+    """sick_until is epoch seconds (UTC), or None to clear."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE schedules
-        SET sick_until=?
-        WHERE user_id=?
-    """, (sick_until, user_id))
-    conn.commit()
-    conn.close()
-
-def update_days(user_id, days):
+    with _write_lock:
+        with conn:
+            conn.execute(_UPDATE_SICK, (sick_until, guild_id, user_id))
+        schedule_store.update(guild_id, user_id, sick_until=sick_until)
+
+@DB_QUERY_SECONDS.time(function="update_days")
+def update_days(guild_id, user_id, days_mask):
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE schedules
-        SET days=?
-        WHERE user_id=?
-    """, (days, user_id))
-    conn.commit()
-    conn.close()
+    with _write_lock:
+        with conn:
+            conn.execute(_UPDATE_DAYS, (days_mask, guild_id, user_id))
+        schedule_store.update(guild_id, user_id, days_mask=days_mask)
 
-def get_all_schedules():
+@DB_QUERY_SECONDS.time(function="clear_expired_sickness")
+def clear_expired_sickness(now_ts):
+    """Clear sick_until where it has passed; returns the (guild_id, user_id) keys cleared."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM schedules")
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
\ No newline at end of file
+    with _write_lock:
+        keys = [(row["guild_id"], row["user_id"]) for row in conn.execute(_SELECT_SICK_EXPIRED, (now_ts,))]
+        if not keys:
+            return keys
+        with conn:
+            conn.execute(_CLEAR_SICK_EXPIRED, (now_ts,))
+        for guild_id, user_id in keys:
+            schedule_store.update(guild_id, user_id, sick_until=None)
+    return keys
+
+@DB_QUERY_SECONDS.time(function="get_all_schedules")
+def get_all_schedules():
+    if schedule_store.loaded:
+        return schedule_store.all()
+    return get_connection().execute(_SELECT_ALL).fetchall()
+
+@DB_QUERY_SECONDS.time(function="get_guild_schedules")
+def get_guild_schedules(guild_id):
+    if schedule_store.loaded:
+        return [row for row in schedule_store.all() if row["guild_id"] == guild_id]
+    return get_connection().execute(_SELECT_GUILD, (guild_id,)).fetchall()
+
+def get_compiled_schedule(guild_id, user_id):
+    """CompiledSchedule for one user in one guild, or None if missing or unparseable."""
+    if schedule_store.loaded:
+        return schedule_store.get_compiled(guild_id, user_id)
+    return _compile_or_none(get_schedule(guild_id, user_id))
+
+def get_compiled_schedules_working_on(weekdays):
+    """CompiledSchedules that work on any of the weekdays (0 = Monday); filtered in SQL when the store isn't loaded."""
+    wanted = sum(1 << d for d in weekdays)
+    if schedule_store.loaded:
+        return [cs for cs in schedule_store.all_compiled() if cs.days_mask & wanted]
+    masks = [mask for mask in range(1, 128) if mask & wanted]
+    if not masks:
+        return []
+    rows = get_connection().execute(_SELECT_WORKING_ON.format(",".join("?" * len(masks))), masks)
+    compiled = (_compile_or_none(row) for row in rows)
+    return [cs for cs in compiled if cs is not None]
+
+def get_all_compiled_schedules():
+    if schedule_store.loaded:
+        return schedule_store.all_compiled()
+    compiled = (_compile_or_none(row) for row in get_all_schedules())
+    return [cs for cs in compiled if cs is not None]
+
+def _compile_or_none(row):
+    if row is None:
+        return None
+    try:
+        return compile_schedule(row)
+    except (ValueError, KeyError):
+        return None
+
+@DB_QUERY_SECONDS.time(function="load_schedule_store")
+def load_schedule_store():
+    """(Re)load the in-memory store from SQLite, e.g. at startup or after the DB file was edited externally."""
+    with _write_lock:
+        schedule_store.load(get_connection().execute(_SELECT_ALL).fetchall())
+    return len(schedule_store)
@@ -0,0 +1,106 @@
+import threading
+from app.core.logger import logger
+from app.utils.time_utils import compile_schedule
+
+class ScheduleStore:
+    """
+    In-process copy of the schedules table, keyed by (guild_id, user_id).
+    Each entry is (row, compiled): the row as a plain dict plus its
+    CompiledSchedule, built once per write (None if the row can't be parsed).
+    Entries are never mutated in place: every write swaps in a new dict, so
+    readers on other threads always see a consistent snapshot.
+    version increases on every change so derived caches know when to rebuild;
+    listeners are called with (key, compiled) after each write, and with
+    (None, None) after a full load, bulk write or invalidate.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.version = 0
+        self.loaded = False
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, key, compiled):
+        for callback in self._listeners:
+            callback(key, compiled)
+
+    def load(self, rows):
+        with self._lock:
+            self._entries = {(row["guild_id"], row["user_id"]): _entry(row) for row in rows}
+            self.loaded = True
+            self.version += 1
+            self._notify(None, None)
+
+    def invalidate(self):
+        """Drop everything; reads fall back to SQLite until the next load()."""
+        with self._lock:
+            self._entries = {}
+            self.loaded = False
+            self.version += 1
+            self._notify(None, None)
+
+    def get(self, guild_id, user_id):
+        entry = self._entries.get((guild_id, user_id))
+        return entry[0] if entry else None
+
+    def get_compiled(self, guild_id, user_id):
+        entry = self._entries.get((guild_id, user_id))
+        return entry[1] if entry else None
+
+    def all(self):
+        return [row for row, _ in self._entries.values()]
+
+    def all_compiled(self):
+        return [cs for _, cs in self._entries.values() if cs is not None]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, row):
+        with self._lock:
+            if not self.loaded:
+                return
+            key = (row["guild_id"], row["user_id"])
+            entries = dict(self._entries)
+            entries[key] = entry = _entry(row)
+            self._entries = entries
+            self.version += 1
+            self._notify(key, entry[1])
+
+    def put_many(self, rows):
+        """Write-through for a bulk upsert: one copy and one version bump for the whole batch."""
+        with self._lock:
+            if not self.loaded:
+                return
+            entries = dict(self._entries)
+            for row in rows:
+                entries[(row["guild_id"], row["user_id"])] = _entry(row)
+            self._entries = entries
+            self.version += 1
+            self._notify(None, None)
+
+    def update(self, guild_id, user_id, **fields):
+        key = (guild_id, user_id)
+        with self._lock:
+            if not self.loaded or key not in self._entries:
+                return
+            entries = dict(self._entries)
+            entries[key] = entry = _entry({**entries[key][0], **fields})
+            self._entries = entries
+            self.version += 1
+            self._notify(key, entry[1])
+
+def _entry(row):
+    row = dict(row)
+    try:
+        compiled = compile_schedule(row)
+    except (ValueError, KeyError) as e:
+        logger.warning(f"[Schedule] Ignoring unparseable schedule for user {row.get('user_id')} in guild {row.get('guild_id')}: {e}")
+        compiled = None
+    return row, compiled
+
+schedule_store = ScheduleStore()
@@ -1,4 +1,8 @@
-from app.db.database import init_db
+from app.db.database import init_db, close_connections
+from app.db import repository
+from app.db.guild_settings import load_guild_settings
+from app.db.role_ledger import load_role_ledger
+from app.db.schedule import load_schedule_store
 from app.bot.client import bot
 from app.core.config import DISCORD_TOKEN
 
@@ -10,4 +14,11 @@ if __name__ == "__main__":
         print("  3. Put it in .env as DISCORD_TOKEN=your_token")
         raise SystemExit(1)
     init_db()  # create SQLite tables
-    bot.run(DISCORD_TOKEN)
\ No newline at end of file
+    load_schedule_store()  # later reads are served from memory
+    load_guild_settings()
+    load_role_ledger()  # what was applied before the restart
+    try:
+        bot.run(DISCORD_TOKEN)
+    finally:
+        repository.shutdown()
+        close_connections()
\ No newline at end of file
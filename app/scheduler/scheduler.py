@@ -1,18 +1,262 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
 from discord.ext import tasks
-from app.services.schedule_service import get_active_users
-from app.services.role_service import update_roles
+from app.core.config import FULL_RECONCILE_MINUTES, SCHEDULER_MODE
+from app.core.logger import logger
+from app.core.metrics import TICK_SECONDS, TICK_LAST_SECONDS, TICK_DRIFT_SECONDS, ACTIVE_USERS
+from app.db import repository
+from app.db.schedule import get_all_compiled_schedules, get_compiled_schedule
+from app.scheduler.transition_queue import TransitionQueue
+from app.scheduler.watchdog import tick_watchdog
+from app.services.schedule_service import fetch_active_users, get_next_transition
+from app.services import snapshot
+from app.services.role_service import due_retries, next_retry_in, submit_active, submit_changes, submit_resume
+
+POLL_INTERVAL = timedelta(minutes=1)
+# Re-check a user this often when no next transition can be computed
+RETRY_INTERVAL = timedelta(minutes=1)
+# Never sleep longer than this, so a wall-clock jump can't stall transitions
+MAX_SLEEP_SECONDS = 300
+# Full sweep of every guild's role holders; None means only at startup
+FULL_RECONCILE_INTERVAL = timedelta(minutes=FULL_RECONCILE_MINUTES) if FULL_RECONCILE_MINUTES > 0 else None
+
+_queue: TransitionQueue | None = None
+# Keys the event scheduler currently treats as on shift
+_active_keys: set | None = None
+_event_task: asyncio.Task | None = None
+_started = False
 
 def start_scheduler(bot):
-    @tasks.loop(minutes=1)
+    """Start the scheduler for this process. Later calls (e.g. after a reconnect) do nothing."""
+    global _started
+    if _started:
+        return
+    _started = True
+    if SCHEDULER_MODE == "event":
+        _start_event_scheduler(bot)
+    else:
+        _start_poll_scheduler(bot)
+
+def _record_tick(mode, started, drift=None, active_count=None):
+    duration = time.perf_counter() - started
+    TICK_SECONDS.observe(duration, mode=mode)
+    TICK_LAST_SECONDS.set(duration, mode=mode)
+    if drift is not None:
+        TICK_DRIFT_SECONDS.set(drift, mode=mode)
+    if active_count is not None:
+        ACTIVE_USERS.set(active_count)
+
+def _diff_active(previous, active):
+    """{key: should_have_role} for keys whose state differs between two active sets."""
+    changes = {key: True for key in active - previous}
+    changes.update((key, False) for key in previous - active)
+    return changes
+
+def _start_poll_scheduler(bot):
+    # Ideal wall-clock grid the ticks should follow; drift is how far behind it a tick starts
+    expected = {"next": None}
+    # Evaluate schedules from the in-memory store while the gateway is still connecting,
+    # so the first tick after ready only has to hand the result to the guild workers
+    warm = {"at": datetime.now(timezone.utc)}
+    warm["task"] = asyncio.get_running_loop().create_task(fetch_active_users(warm["at"]))
+    # Active set of the previous tick, and when every guild was last swept in full
+    last = {"active": None, "full_at": None}
+
+    async def tick():
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        drift = (now - expected["next"]).total_seconds() if expected["next"] else 0.0
+        expected["next"] = (expected["next"] or now) + POLL_INTERVAL
+        task = warm.pop("task", None)
+        if task is not None and now - warm["at"] < POLL_INTERVAL:
+            active, evaluated_at = await task, warm["at"]
+        else:
+            active, evaluated_at = await fetch_active_users(now), now
+        snapshot.publish(evaluated_at, active)
+        active_keys = set(active)
+        # Each guild reconciles on its own worker; a slow guild doesn't hold up the tick or the others.
+        # The first tick resumes from the role ledger; after that only the users who flipped
+        # since the last tick, and transient failures whose backoff passed, are sent, with a full sweep
+        # every FULL_RECONCILE_MINUTES.
+        if last["active"] is None:
+            submit_resume(bot, active)
+            last["full_at"] = now
+            # Past sick_until values are cleared with every sweep, so the partial index only holds current sickness
+            await repository.clear_expired_sickness(now.timestamp())
+        elif FULL_RECONCILE_INTERVAL and now - last["full_at"] >= FULL_RECONCILE_INTERVAL:
+            submit_active(bot, active)
+            last["full_at"] = now
+            await repository.clear_expired_sickness(now.timestamp())
+        else:
+            changes = _diff_active(last["active"], active_keys)
+            changes.update(due_retries(active_keys))
+            if changes:
+                submit_changes(bot, changes)
+        last["active"] = active_keys
+        _record_tick("poll", started, drift, len(active_keys))
+
+    @tasks.loop(seconds=POLL_INTERVAL.total_seconds())
     async def loop():
-        active = get_active_users()
-        await update_roles(bot, active)
+        with tick_watchdog.watch("poll", bot):
+            await tick()
 
     @loop.before_loop
     async def before_loop():
+        # The first iteration runs as soon as this returns, so roles apply right after ready
         await bot.wait_until_ready()
-        # Run once immediately so roles apply without waiting 1 minute
-        active = get_active_users()
-        await update_roles(bot, active)
 
-    loop.start()
\ No newline at end of file
+    loop.start()
+
+def _start_event_scheduler(bot):
+    global _queue, _event_task
+    _queue = TransitionQueue()
+    # Kept referenced: the loop only holds weak references to tasks
+    _event_task = asyncio.get_running_loop().create_task(_run_event_scheduler(bot, _queue))
+
+async def _run_event_scheduler(bot, queue: TransitionQueue):
+    global _active_keys
+    # Plan everyone once at startup (roles resume from the ledger), then only the users
+    # whose state can flip. The plan is built from the in-memory store while the gateway
+    # connects; anything that flips before ready is already due in the queue and is
+    # handled on the first wake-up.
+    while True:
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        try:
+            active, plan = await repository.run(_plan_all, now)
+            break
+        except Exception as e:
+            logger.exception(f"[Scheduler] Planning schedules failed, retrying in {RETRY_INTERVAL}: {e}")
+            await asyncio.sleep(RETRY_INTERVAL.total_seconds())
+    for key, next_utc in plan:
+        if key not in queue:
+            queue.schedule(key, next_utc or now + RETRY_INTERVAL)
+    waiting = time.perf_counter()
+    await bot.wait_until_ready()
+    started += time.perf_counter() - waiting  # tick time excludes the wait for the gateway
+    submit_resume(bot, active)
+    active_keys = _active_keys = set(active)
+    snapshot.publish(now, active_keys)
+    _record_tick("event", started, 0.0, len(active_keys))
+    next_full = now + FULL_RECONCILE_INTERVAL if FULL_RECONCILE_INTERVAL else None
+
+    while True:
+        next_instant = queue.next_instant()
+        timeout = MAX_SLEEP_SECONDS
+        if next_instant is not None:
+            timeout = min(timeout, max(0.0, (next_instant - datetime.now(timezone.utc)).total_seconds()))
+        if next_full is not None:
+            timeout = min(timeout, max(0.0, (next_full - datetime.now(timezone.utc)).total_seconds()))
+        retry_in = next_retry_in()
+        if retry_in is not None:
+            timeout = min(timeout, retry_in)
+        await queue.wait(timeout)
+
+        try:
+            next_full = await _event_tick(bot, queue, active_keys, next_instant, next_full)
+        except Exception as e:
+            # One bad wake-up (e.g. a SQLite error) must not end event mode
+            logger.exception(f"[Scheduler] Event tick failed: {e}")
+
+async def _event_tick(bot, queue: TransitionQueue, active_keys, next_instant, next_full):
+    """Handle one wake-up of the event scheduler; returns the new next_full."""
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    if next_full is not None and now >= next_full:
+        # Consistency check: catches drift no member event reported (e.g. missed while disconnected)
+        submit_active(bot, active_keys)
+        next_full = now + FULL_RECONCILE_INTERVAL
+        await repository.clear_expired_sickness(now.timestamp())
+    else:
+        # Transient failures whose backoff has passed are sent again, as the poll ticks do
+        retries = due_retries(active_keys)
+        if retries:
+            submit_changes(bot, retries)
+    due = queue.pop_due(now)
+    if not due:
+        return next_full
+    with tick_watchdog.watch("event", bot):
+        drift = (now - next_instant).total_seconds() if next_instant and next_instant <= now else 0.0
+        try:
+            changes, plan = await repository.run(_plan_users, due, now)
+        except Exception:
+            # Popped already: put them back so they are planned again on a later wake-up
+            for key in due:
+                if key not in queue:
+                    queue.schedule(key, now + RETRY_INTERVAL)
+            raise
+        for key, next_utc in plan:
+            if key not in queue:  # rescheduled by a command while we were planning
+                queue.schedule(key, next_utc or now + RETRY_INTERVAL)
+        submit_changes(bot, changes)
+        for key, is_active in changes.items():
+            if is_active:
+                active_keys.add(key)
+            else:
+                active_keys.discard(key)
+        snapshot.publish(now, active_keys)
+        _record_tick("event", started, drift, len(active_keys))
+    return next_full
+
+def _plan_all(now):
+    """Active keys and (key, next_transition) for every schedule. Runs on a DB worker."""
+    active = []
+    plan = []
+    for cs in get_all_compiled_schedules():
+        is_active, next_utc = get_next_transition(cs, now)
+        if is_active:
+            active.append(cs.key)
+        plan.append((cs.key, next_utc))
+    return active, plan
+
+def _plan_users(keys, now):
+    """Role state and next transition for specific (guild_id, user_id) keys. Runs on a DB worker."""
+    changes = {}
+    plan = []
+    for key in keys:
+        cs = get_compiled_schedule(*key)
+        if cs is None:
+            # Schedule deleted (or unparseable): off shift, and nothing left to plan
+            changes[key] = False
+            continue
+        is_active, next_utc = get_next_transition(cs, now)
+        changes[key] = is_active
+        plan.append((key, next_utc))
+    return changes, plan
+
+async def reschedule_user(guild_id, user_id):
+    """Re-evaluate one user right away after their schedule changed (event mode only)."""
+    if _queue is None:
+        return
+    _queue.schedule((guild_id, user_id), datetime.now(timezone.utc))
+
+async def reschedule_all(guild_id=None):
+    """
+    Re-evaluate every scheduled user (in one guild, or all) right away, e.g.
+    after reloading the store (event mode only). Users who are active or
+    queued but whose schedule is gone are included, so they lose the role.
+    """
+    if _queue is None:
+        return
+    now = datetime.now(timezone.utc)
+    rows = await repository.get_all_schedules() if guild_id is None else await repository.get_guild_schedules(guild_id)
+    keys = {(row["guild_id"], row["user_id"]) for row in rows}
+    keys.update(_active_keys or ())
+    keys.update(_queue.keys())
+    for key in keys:
+        if guild_id is None or key[0] == guild_id:
+            _queue.schedule(key, now)
+
+async def reconcile_now(bot, guild_id=None):
+    """
+    One full sweep right away (for one guild, or all), instead of waiting for
+    the next tick. Use after bulk changes such as a roster import. In event
+    mode every user is also re-planned, so the queue matches the new schedules.
+    """
+    if _queue is not None:
+        await reschedule_all(guild_id)
+    now = datetime.now(timezone.utc)
+    active = await fetch_active_users(now)
+    snapshot.publish(now, active)
+    submit_active(bot, active, None if guild_id is None else [guild_id])
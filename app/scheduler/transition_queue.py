@@ -0,0 +1,62 @@
+import asyncio
+import heapq
+from datetime import datetime
+
+class TransitionQueue:
+    """
+    Priority queue of upcoming per-schedule transition instants, keyed by
+    (guild_id, user_id). Each key has at most one live entry; rescheduling
+    leaves a stale heap entry behind that is skipped when it reaches the top.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}  # key -> instant of the live entry
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def schedule(self, key, when: datetime):
+        self._due[key] = when
+        heapq.heappush(self._heap, (when, key))
+        self._wakeup.set()
+
+    def keys(self) -> list:
+        return list(self._due)
+
+    def discard(self, key):
+        self._due.pop(key, None)
+
+    def _drop_stale(self):
+        while self._heap:
+            when, key = self._heap[0]
+            if self._due.get(key) == when:
+                return
+            heapq.heappop(self._heap)
+
+    def next_instant(self) -> datetime | None:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> list:
+        """Remove and return every key whose instant is at or before now."""
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, key = heapq.heappop(self._heap)
+            del self._due[key]
+            due.append(key)
+            self._drop_stale()
+        return due
+
+    async def wait(self, timeout: float | None):
+        """Sleep until timeout elapses or a new entry is scheduled."""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,233 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from app.core.config import LOOP_LAG_THRESHOLD_SECONDS, PROFILE_DIR, TICK_BUDGET_SECONDS
+from app.core.logger import logger
+from app.core.metrics import ACTIVE_USERS, LOOP_LAG_SECONDS, LOOP_STALLS, TICKS_OVER_BUDGET
+from app.db.schedule_store import schedule_store
+from app.services.role_service import role_executor_stats
+
+# Stack sampling period while a tick runs or the loop is stalled
+SAMPLE_INTERVAL = 0.01
+# How often the loop-lag probe wakes up
+PROBE_INTERVAL = 0.25
+# Oldest capture files are deleted beyond this many
+MAX_PROFILE_FILES = 200
+# Innermost frames that mean a thread is waiting, not working
+_IDLE_FRAMES = {("selectors.py", "select"), ("thread.py", "_worker")}
+
+def _collapse(frame) -> str:
+    """Root-first "file:function:line;..." for one stack, as flamegraph tools read it."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES
+
+def _context_lines(bot) -> list[str]:
+    """Schedule, member and queue counts at the moment of a capture."""
+    lines = [f"schedules={len(schedule_store)} active={ACTIVE_USERS.get() or 0} role_queue={role_executor_stats()['queue_depth']}"]
+    for guild in (bot.guilds if bot is not None else ()):
+        lines.append(f"guild {guild.id}: {len(guild.members)} members cached of {getattr(guild, 'member_count', None) or '?'}")
+    return lines
+
+def _write(kind, header, body) -> str:
+    """Write one capture under PROFILE_DIR, dropping the oldest beyond MAX_PROFILE_FILES; returns its path."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+    path = os.path.join(PROFILE_DIR, f"{kind}-{stamp}.txt")
+    with open(path, "w") as f:
+        f.writelines(f"# {line}\n" for line in header)
+        f.write(body)
+    files = [os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)]
+    for old in sorted(files, key=os.path.getmtime)[:-MAX_PROFILE_FILES]:
+        os.remove(old)
+    return path
+
+def _collapsed_body(samples: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+class StackSampler:
+    """
+    Samples the stacks of the event loop thread and the DB worker threads from
+    a background thread, between start() and stop(). Cheap enough to run on
+    every tick, so a slow one can be explained after the fact.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._active = threading.Event()
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._samples = Counter()
+        self._idle = 0
+        self._thread = None
+
+    def start(self):
+        targets = {threading.get_ident(): "loop"}
+        targets.update((t.ident, t.name) for t in threading.enumerate() if t.name.startswith("db"))
+        with self._lock:
+            self._targets, self._samples, self._idle = targets, Counter(), 0
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tick-sampler", daemon=True)
+            self._thread.start()
+        self._active.set()
+
+    def stop(self) -> tuple[Counter, int]:
+        """(collapsed stack -> samples, idle samples) since start()."""
+        self._active.clear()
+        with self._lock:
+            return self._samples, self._idle
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            frames = sys._current_frames()
+            with self._lock:
+                if self._active.is_set():
+                    for ident, name in self._targets.items():
+                        frame = frames.get(ident)
+                        if frame is None:
+                            continue
+                        if _is_idle(frame):
+                            self._idle += 1
+                        else:
+                            self._samples[f"{name};{_collapse(frame)}"] += 1
+            time.sleep(self.interval)
+
+class TickWatchdog:
+    """
+    Measures scheduler ticks against TICK_BUDGET_SECONDS. Every tick is stack
+    sampled; when one runs over budget its samples are written to PROFILE_DIR
+    with the counts at that moment. profile_next(n) instead runs the next n
+    ticks under cProfile and writes each one. cProfile sees everything the
+    event loop runs during the tick, not only the tick itself.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.last_capture = None
+        self._sampler = StackSampler()
+        self._profile_ticks = 0
+
+    @property
+    def profiling_left(self) -> int:
+        return self._profile_ticks
+
+    def profile_next(self, ticks: int):
+        """Profile the next ticks ticks; 0 stops."""
+        self._profile_ticks = max(0, ticks)
+
+    @contextmanager
+    def watch(self, mode, bot=None):
+        profiler = None
+        if self._profile_ticks > 0:
+            self._profile_ticks -= 1
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            self._sampler.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+                self._write_profile(mode, duration, profiler, bot)
+            else:
+                samples, idle = self._sampler.stop()
+                if self.budget and duration > self.budget:
+                    TICKS_OVER_BUDGET.inc(mode=mode)
+                    self._write_samples(mode, duration, samples, idle, bot)
+
+    def _write_samples(self, mode, duration, samples, idle, bot):
+        header = [
+            f"Slow {mode} tick: {duration:.3f}s (budget {self.budget:.3f}s)",
+            *_context_lines(bot),
+            f"{sum(samples.values())} busy and {idle} idle samples every {SAMPLE_INTERVAL * 1000:.0f}ms",
+            "Collapsed stacks (thread;frame;... count), for flamegraph.pl or speedscope",
+        ]
+        self.last_capture = _write(f"tick-{mode}-slow", header, _collapsed_body(samples))
+        logger.warning(f"[Watchdog] {mode} tick took {duration:.2f}s (budget {self.budget:.2f}s); stack samples in {self.last_capture}")
+
+    def _write_profile(self, mode, duration, profiler, bot):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+        header = [f"Profiled {mode} tick: {duration:.3f}s (budget {self.budget:.3f}s)", *_context_lines(bot)]
+        self.last_capture = _write(f"tick-{mode}-profile", header, out.getvalue())
+        logger.info(f"[Watchdog] Profiled {mode} tick ({duration:.2f}s) in {self.last_capture}; {self._profile_ticks} left")
+
+class LoopLagProbe:
+    """
+    A task that wakes up every PROBE_INTERVAL and records how late it was, and
+    a thread that notices when it stops waking up. While the loop is stalled
+    for longer than the threshold, the thread samples the loop's stack; when
+    it recovers, the stall is counted and the samples are written to PROFILE_DIR.
+    """
+
+    def __init__(self, threshold, interval=PROBE_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self._beat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        threading.Thread(target=self._watch, name="loop-lag", daemon=True).start()
+
+    async def _run(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG_SECONDS.set(max(0.0, time.perf_counter() - before - self.interval))
+            self._beat = time.monotonic()
+
+    def _watch(self):
+        stalled_since = None
+        samples = Counter()
+        while True:
+            time.sleep(SAMPLE_INTERVAL * 2)
+            now = time.monotonic()
+            if now - self._beat - self.interval > self.threshold:
+                if stalled_since is None:
+                    stalled_since, samples = self._beat + self.interval, Counter()
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    samples[f"loop;{_collapse(frame)}"] += 1
+            elif stalled_since is not None:
+                stalled = self._beat - stalled_since
+                stalled_since = None
+                LOOP_STALLS.inc()
+                header = [
+                    f"Event loop stalled for {stalled:.3f}s (threshold {self.threshold:.3f}s)",
+                    f"{sum(samples.values())} samples every {SAMPLE_INTERVAL * 2000:.0f}ms",
+                    "Collapsed stacks (thread;frame;... count), for flamegraph.pl or speedscope",
+                ]
+                path = _write("loop-stall", header, _collapsed_body(samples))
+                logger.warning(f"[Watchdog] Event loop stalled for {stalled:.2f}s; stack samples in {path}")
+
+tick_watchdog = TickWatchdog(TICK_BUDGET_SECONDS)
+_probe: LoopLagProbe | None = None
+
+def start_loop_lag_probe():
+    """Start the loop-lag probe once per process (no-op if LOOP_LAG_THRESHOLD_SECONDS is 0)."""
+    global _probe
+    if _probe is None and LOOP_LAG_THRESHOLD_SECONDS > 0:
+        _probe = LoopLagProbe(LOOP_LAG_THRESHOLD_SECONDS)
+        _probe.start()
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from app.core.config import GUILD_IDS
+from app.db.schedule import get_compiled_schedule
+from app.services.role_service import find_managed_role, submit_changes
+from app.utils.time_utils import is_on_shift
+
+def should_have_role(guild_id, user_id, now_utc: datetime | None = None) -> bool:
+    """Desired role state for one member right now. Members without a schedule shouldn't hold it."""
+    cs = get_compiled_schedule(guild_id, user_id)
+    return cs is not None and is_on_shift(cs, now_utc or datetime.now(timezone.utc))
+
+def check_member(bot, member) -> bool | None:
+    """
+    Compare one member's role with their schedule and queue a correction on
+    the guild's reconciler if they differ. Returns the desired state if a
+    correction was queued, else None. Cheap enough to run on every member event.
+    """
+    guild = member.guild
+    if guild.id not in GUILD_IDS or member.id == bot.user.id:
+        return None
+    role = find_managed_role(guild)
+    has_role = role is not None and role in member.roles
+    wanted = should_have_role(guild.id, member.id)
+    if has_role == wanted:
+        return None
+    submit_changes(bot, {(guild.id, member.id): wanted})
+    return wanted
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from collections import OrderedDict
+from app.core.config import MEMBER_CACHE, MEMBER_CACHE_SIZE
+from app.core.logger import logger
+
+# Gateway limit for one REQUEST_GUILD_MEMBERS by user_ids
+QUERY_BATCH = 100
+# Don't ask again for a scheduled user who isn't in the guild for this long (seconds)
+ABSENT_RETRY_SECONDS = 3600
+
+class LeanMemberCache:
+    """
+    For MEMBER_CACHE=lean: the bot starts without chunking and with discord.py's
+    member cache flags off, so guilds only hold the members this class puts
+    there. Before each reconciliation the scheduled members that are missing
+    are fetched with batched query_members requests. After that, discord.py
+    keeps them current from gateway events as usual, so guild.get_member and
+    role.members behave as in full mode for everyone who has a schedule.
+    Least recently needed members are evicted once a guild has more than
+    max_size cached.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lru = {}  # guild_id -> OrderedDict of user_id, least recently needed first
+        self._absent = {}  # (guild_id, user_id) -> monotonic time to retry after
+        self.fetched = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return sum(len(lru) for lru in self._lru.values())
+
+    async def prepare(self, guild, user_ids):
+        """Make sure these members of guild are cached (those still in the guild)."""
+        lru = self._lru.setdefault(guild.id, OrderedDict())
+        if len(user_ids) > self.max_size:
+            logger.warning(f"[Members] {guild.name} has {len(user_ids)} scheduled members but MEMBER_CACHE_SIZE is {self.max_size}; raise it to avoid refetching")
+        now = time.monotonic()
+        missing = []
+        for user_id in user_ids:
+            if guild.get_member(user_id) is not None:
+                lru[user_id] = None
+                lru.move_to_end(user_id)
+            elif self._absent.get((guild.id, user_id), 0) <= now:
+                missing.append(user_id)
+
+        for i in range(0, len(missing), QUERY_BATCH):
+            batch = missing[i:i + QUERY_BATCH]
+            try:
+                members = await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+            except asyncio.TimeoutError:
+                logger.warning(f"[Members] Timed out fetching {len(batch)} member(s) of {guild.name}; retrying next pass")
+                continue
+            found = {m.id for m in members}
+            for user_id in batch:
+                if user_id in found:
+                    lru[user_id] = None
+                    lru.move_to_end(user_id)
+                    self._absent.pop((guild.id, user_id), None)
+                else:
+                    self._absent[(guild.id, user_id)] = now + ABSENT_RETRY_SECONDS
+            self.fetched += len(found)
+
+        self._evict(guild, lru)
+
+    def forget(self, guild_id, user_id):
+        """A member left; discord.py already dropped them from the guild."""
+        lru = self._lru.get(guild_id)
+        if lru is not None:
+            lru.pop(user_id, None)
+
+    def _evict(self, guild, lru):
+        me = guild.me.id if guild.me else None
+        while len(lru) > self.max_size:
+            user_id, _ = lru.popitem(last=False)
+            self.evicted += 1
+            if user_id == me:
+                continue
+            member = guild.get_member(user_id)
+            if member is not None:
+                # discord.py has no public way to drop one member from its cache
+                guild._remove_member(member)
+
+member_cache = LeanMemberCache(MEMBER_CACHE_SIZE) if MEMBER_CACHE == "lean" else None
+
+async def prepare_members(guild, user_ids):
+    """No-op with the full member cache; in lean mode, fetch the given members if they aren't cached."""
+    if member_cache is not None:
+        await member_cache.prepare(guild, user_ids)
+
+def forget_member(guild_id, user_id):
+    if member_cache is not None:
+        member_cache.forget(guild_id, user_id)
@@ -0,0 +1,182 @@
+import asyncio
+import itertools
+import random
+import time
+from collections import deque
+import discord
+from app.core.metrics import ROLE_API_CALLS, ROLE_API_SECONDS
+
+# Lower runs first: people coming on duty shouldn't wait behind a wave of removals
+PRIORITY_ADD = 0
+PRIORITY_REMOVE = 1
+
+class TokenBucket:
+    """Simple token bucket; a 429 blocks the whole bucket until Retry-After passes."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def block_for(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+class RoleMutationExecutor:
+    """
+    Runs member.add_roles / member.remove_roles with bounded concurrency.
+    Requests are rate limited per route bucket (role mutations share the guild
+    as their major parameter), retried with backoff on 429 and 5xx, and
+    ordered by priority then submission order.
+    """
+
+    def __init__(self, concurrency=8, rate=5.0, burst=5, max_retries=5, base_backoff=0.5):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self._loop = None
+        self._queue = None
+        self._workers = []
+        self._buckets = {}
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._latencies = deque(maxlen=1024)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or the previous event loop is gone: start fresh on this one
+            self._loop = loop
+            self._queue = asyncio.PriorityQueue()
+            self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def submit(self, member, role, add: bool, priority: int | None = None) -> asyncio.Future:
+        """Queue one role mutation; the returned future resolves when it is done or raises its error."""
+        self._ensure_started()
+        if priority is None:
+            priority = PRIORITY_ADD if add else PRIORITY_REMOVE
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._seq), member, role, add, future, time.monotonic()))
+        self.submitted += 1
+        return future
+
+    def _bucket(self, member) -> TokenBucket:
+        key = member.guild.id
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            _, _, member, role, add, future, enqueued_at = await self._queue.get()
+            self._in_flight += 1
+            try:
+                await self._run(member, role, add)
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.completed += 1
+                if not future.done():
+                    future.set_result(None)
+            finally:
+                self._in_flight -= 1
+                self._latencies.append(time.monotonic() - enqueued_at)
+                self._queue.task_done()
+
+    async def _run(self, member, role, add):
+        bucket = self._bucket(member)
+        action = "add" if add else "remove"
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            started = time.monotonic()
+            try:
+                if add:
+                    await member.add_roles(role)
+                else:
+                    await member.remove_roles(role)
+                ROLE_API_CALLS.inc(action=action, outcome="ok")
+                return
+            except (discord.Forbidden, discord.NotFound) as e:
+                ROLE_API_CALLS.inc(action=action, outcome=type(e).__name__.lower())
+                raise
+            except discord.HTTPException as e:
+                status = getattr(e, "status", 0)
+                ROLE_API_CALLS.inc(action=action, outcome=str(status or "error"))
+                if attempt >= self.max_retries or not (status == 429 or status >= 500):
+                    raise
+                # The backoff is this job's own; the guild's bucket only waits out Retry-After
+                delay = self.base_backoff * (2 ** attempt) + random.uniform(0, self.base_backoff)
+                if status == 429:
+                    retry_after = _retry_after(e)
+                    bucket.block_for(retry_after)
+                    delay = max(delay, retry_after)
+                attempt += 1
+                self.retries += 1
+            finally:
+                ROLE_API_SECONDS.observe(time.monotonic() - started, action=action)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """Queue depth, in-flight count, totals and recent latency (seconds, enqueue to done)."""
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "in_flight": self._in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "latency_p50": pct(0.50),
+            "latency_p95": pct(0.95),
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+
+def _retry_after(e) -> float:
+    retry_after = getattr(e, "retry_after", None)
+    if retry_after is None and getattr(e, "response", None) is not None:
+        retry_after = e.response.headers.get("Retry-After")
+    try:
+        return float(retry_after or 0)
+    except ValueError:
+        return 0.0
@@ -1,30 +1,336 @@
+import asyncio
+import time
+import aiohttp
 import discord
-from app.core.config import ROLE_NAME, GUILD_ID
+from dataclasses import dataclass, field
+from app.core.config import (
+    GUILD_IDS,
+    ROLE_CONCURRENCY,
+    ROLE_RATE_PER_SECOND,
+    ROLE_RATE_BURST,
+    ROLE_MAX_RETRIES,
+    STARTUP_AUDIT,
+)
+from app.core.logger import logger
+from app.core.metrics import registry
+from app.db import repository, role_ledger
+from app.db.guild_settings import get_role_id, get_role_name
+from app.services.member_cache import member_cache, prepare_members
+from app.services.role_executor import RoleMutationExecutor
 
-async def update_roles(bot, active_user_ids):
-    guild = bot.get_guild(GUILD_ID)
+# One executor per guild: each has its own queue, workers and rate limit, so a
+# guild that is large or being throttled never holds up role changes elsewhere
+_executors: dict[int, RoleMutationExecutor] = {}
+
+# Changes that failed transiently (429, 5xx, timeouts) are sent again after a
+# backoff that doubles per attempt up to the cap; permanent failures are left
+# to the next full sweep. guild_id -> {user_id: (attempts, monotonic due time)}
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 1800
+_retries: dict[int, dict[int, tuple[int, float]]] = {}
+
+def get_role_executor(guild_id) -> RoleMutationExecutor:
+    """The executor for every role mutation in one guild, so all callers share its rate limit."""
+    executor = _executors.get(guild_id)
+    if executor is None:
+        executor = _executors[guild_id] = RoleMutationExecutor(
+            concurrency=ROLE_CONCURRENCY,
+            rate=ROLE_RATE_PER_SECOND,
+            burst=ROLE_RATE_BURST,
+            max_retries=ROLE_MAX_RETRIES,
+        )
+    return executor
+
+def role_executor_stats() -> dict:
+    """Executor stats summed over guilds; latencies are the worst guild's."""
+    total = {}
+    for executor in list(_executors.values()):
+        for name, value in executor.stats().items():
+            total[name] = max(total.get(name, 0), value) if name.startswith("latency") else total.get(name, 0) + value
+    return total or RoleMutationExecutor().stats()
+
+registry.gauge(
+    "workbot_role_queue_depth", "Role mutations waiting in the executor queues.",
+    callback=lambda: role_executor_stats()["queue_depth"],
+)
+
+def group_by_guild(keys) -> dict[int, list[int]]:
+    """(guild_id, user_id) keys -> {guild_id: [user_id, ...]}."""
+    grouped = {}
+    for guild_id, user_id in keys:
+        grouped.setdefault(guild_id, []).append(user_id)
+    return grouped
+
+@dataclass
+class ReconcileReport:
+    """What a reconciliation pass did, by user ID."""
+    adds: list = field(default_factory=list)
+    removes: list = field(default_factory=list)
+    skips: list = field(default_factory=list)  # active users not found in the guild, or already correct
+    failures: list = field(default_factory=list)  # (user_id, reason)
+
+def find_managed_role(guild):
+    """The role this bot manages in guild: by ID once picked with /setrole, else by name. None if missing."""
+    role_id = get_role_id(guild.id)
+    if role_id is not None:
+        return next((r for r in guild.roles if r.id == role_id), None)
+    role_name = get_role_name(guild.id)
+    return next((r for r in guild.roles if r.name == role_name), None)
+
+def _get_guild_and_role(bot, guild_id):
+    """Look up the guild and the role to manage there, or (None, None) if unusable."""
+    guild = bot.get_guild(guild_id)
     if guild is None:
-        print(f"[Role] Guild {GUILD_ID} not found. Is the bot in that server? Is GUILD_ID in .env correct?")
-        return
+        logger.warning(f"[Role] Guild {guild_id} not found. Is the bot in that server? Is it listed in GUILD_IDS in .env?")
+        return None, None
 
-    role = next((r for r in guild.roles if r.name == ROLE_NAME), None)
+    role = find_managed_role(guild)
     if role is None:
-        print(f"[Role] Role '{ROLE_NAME}' not found on the server. Create a role with that exact name (case-sensitive).")
-        return
+        role_name = get_role_name(guild_id)
+        logger.warning(f"[Role] Role '{role_name}' not found on {guild.name}. Create a role with that exact name (case-sensitive) or pick one with /setrole.")
+        return None, None
 
     # Bot can only assign roles that are BELOW its highest role in Server Settings → Roles
     bot_member = guild.get_member(bot.user.id)
     if bot_member and bot_member.top_role <= role:
-        print(f"[Role] Cannot assign '{ROLE_NAME}': it must be below the bot's role in Server Settings → Roles (drag it down).")
-        return
-
-    for member in guild.members:
-        try:
-            if member.id in active_user_ids:
-                if role not in member.roles:
-                    await member.add_roles(role)
+        logger.warning(f"[Role] Cannot assign '{role.name}' on {guild.name}: it must be below the bot's role in Server Settings → Roles (drag it down).")
+        return None, None
+
+    return guild, role
+
+async def reconcile_guild(bot, guild_id, active_user_ids):
+    """
+    Reconcile one guild's role against its active users. Only members in the
+    symmetric difference of role.members and active_user_ids are touched.
+    """
+    report = ReconcileReport()
+    guild, role = _get_guild_and_role(bot, guild_id)
+    if role is None:
+        return report
+
+    wanted = set(active_user_ids)
+    if member_cache is not None:
+        # Lean mode: holders are only visible once every scheduled member is cached
+        scheduled = [row["user_id"] for row in await repository.get_guild_schedules(guild_id)]
+        await prepare_members(guild, scheduled)
+    holders = {m.id: m for m in role.members}
+
+    jobs = []
+    absent = []
+    for user_id in wanted - holders.keys():
+        member = guild.get_member(user_id)
+        if member is None:
+            absent.append(user_id)
+            report.skips.append(user_id)
+            continue
+        jobs.append((member, True))
+    for user_id in holders.keys() - wanted:
+        jobs.append((holders[user_id], False))
+
+    # Holders left alone, and ledger holders who lost the role some other way, settle the ledger
+    observed = {user_id: True for user_id in holders.keys() & wanted}
+    observed.update((user_id, False) for user_id in role_ledger.holders(guild_id) - holders.keys())
+    await _apply_all(guild_id, role, jobs, report, observed, absent)
+    return report
+
+async def update_roles(bot, active_keys, guild_ids=None):
+    """
+    Reconcile every managed guild (GUILD_IDS by default) against the active
+    (guild_id, user_id) keys, all guilds concurrently. Returns {guild_id: ReconcileReport}.
+    """
+    by_guild = group_by_guild(active_keys)
+    guild_ids = list(GUILD_IDS if guild_ids is None else guild_ids)
+    reports = await asyncio.gather(*(reconcile_guild(bot, g, by_guild.get(g, ())) for g in guild_ids))
+    return dict(zip(guild_ids, reports))
+
+async def update_guild_member_roles(bot, guild_id, changes):
+    """Apply the role state for specific users in one guild. changes maps user_id -> should_have_role."""
+    report = ReconcileReport()
+    if not changes:
+        return report
+    guild, role = _get_guild_and_role(bot, guild_id)
+    if role is None:
+        return report
+
+    await prepare_members(guild, list(changes))
+    jobs = []
+    observed = {}
+    absent = []
+    for user_id, should_have in changes.items():
+        member = guild.get_member(user_id)
+        if member is None or (role in member.roles) == should_have:
+            if member is None:
+                absent.append(user_id)
             else:
-                if role in member.roles:
-                    await member.remove_roles(role)
-        except discord.Forbidden:
-            print(f"[Role] Missing permission to manage roles for {member}. Bot needs 'Manage Roles' and the role must be below the bot's role.")
\ No newline at end of file
+                observed[user_id] = should_have
+            report.skips.append(user_id)
+            continue
+        jobs.append((member, should_have))
+
+    await _apply_all(guild_id, role, jobs, report, observed, absent)
+    return report
+
+def _is_transient(error) -> bool:
+    """Whether a failed role change may succeed if sent again later."""
+    if isinstance(error, discord.HTTPException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError, OSError))
+
+async def _apply_all(guild_id, role, jobs, report, observed=None, absent=()):
+    """
+    Run (member, add) jobs through the guild's executor and record the outcome
+    of each, in the report, the role ledger and the retry schedule. observed
+    maps user_id -> has_role for members seen in the right state without a
+    request; absent lists user_ids no longer in the guild, which are dropped.
+    """
+    # Written before sending, so a restart mid-pass knows which changes to retry
+    await repository.mark_pending(guild_id, {member.id: add for member, add in jobs})
+    executor = get_role_executor(guild_id)
+    futures = [executor.submit(member, role, add) for member, add in jobs]
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    applied = {}
+    absent = list(absent)
+    retries = _retries.setdefault(guild_id, {})
+    for (member, add), result in zip(jobs, results):
+        retry = retries.pop(member.id, None)
+        if isinstance(result, discord.Forbidden):
+            logger.warning(f"[Role] Missing permission to manage roles for {member}. Bot needs 'Manage Roles' and the role must be below the bot's role.")
+            report.failures.append((member.id, "forbidden"))
+        elif isinstance(result, discord.NotFound):
+            # Left the guild since the member cache was read
+            absent.append(member.id)
+            report.skips.append(member.id)
+        elif isinstance(result, Exception):
+            logger.warning(f"[Role] Failed to {'add' if add else 'remove'} role for {member}: {result}")
+            report.failures.append((member.id, str(result)))
+            if _is_transient(result):
+                attempts = retry[0] + 1 if retry else 1
+                delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+                retries[member.id] = (attempts, time.monotonic() + delay)
+        else:
+            applied[member.id] = add
+            (report.adds if add else report.removes).append(member.id)
+    for user_id in (*(observed or ()), *absent):
+        retries.pop(user_id, None)
+    await repository.record_roles(guild_id, applied, observed, [user_id for user_id, _ in report.failures], absent)
+
+class GuildReconciler:
+    """
+    Background reconciliation worker for one guild. The scheduler hands it the
+    latest desired state and moves on; while a pass is running, newer states
+    are merged into one pending pass instead of queueing behind each other, so
+    a slow or throttled guild only ever falls behind on its own work.
+    """
+
+    def __init__(self, bot, guild_id):
+        self.bot = bot
+        self.guild_id = guild_id
+        self.last_report: ReconcileReport | None = None
+        self._active = None  # latest complete active set, superseding any changes before it
+        self._changes = {}  # user_id -> should_have_role, when no complete set is pending
+        self._task = None
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def set_active(self, user_ids):
+        self._active = set(user_ids)
+        self._changes = {}
+        self._kick()
+
+    def apply_changes(self, changes):
+        if self._active is not None:
+            for user_id, should_have in changes.items():
+                if should_have:
+                    self._active.add(user_id)
+                else:
+                    self._active.discard(user_id)
+        else:
+            self._changes.update(changes)
+        self._kick()
+
+    def _kick(self):
+        if not self.busy:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._active is not None or self._changes:
+            active, changes = self._active, self._changes
+            self._active, self._changes = None, {}
+            try:
+                if active is not None:
+                    self.last_report = await reconcile_guild(self.bot, self.guild_id, active)
+                else:
+                    self.last_report = await update_guild_member_roles(self.bot, self.guild_id, changes)
+            except Exception as e:
+                logger.exception(f"[Role] Reconciliation failed for guild {self.guild_id}: {e}")
+
+    async def wait(self):
+        """Wait until nothing is pending or running."""
+        while self.busy:
+            await asyncio.shield(self._task)
+
+_reconcilers: dict[int, GuildReconciler] = {}
+
+def get_reconciler(bot, guild_id) -> GuildReconciler:
+    reconciler = _reconcilers.get(guild_id)
+    if reconciler is None:
+        reconciler = _reconcilers[guild_id] = GuildReconciler(bot, guild_id)
+    return reconciler
+
+def submit_active(bot, active_keys, guild_ids=None):
+    """Hand each managed guild its active users without waiting for the role changes."""
+    by_guild = group_by_guild(active_keys)
+    for guild_id in GUILD_IDS if guild_ids is None else guild_ids:
+        get_reconciler(bot, guild_id).set_active(by_guild.get(guild_id, ()))
+
+def submit_resume(bot, active_keys):
+    """
+    First pass after a (re)start. A guild with a role ledger only gets the
+    users whose desired state differs from what was last applied, plus any
+    change that was pending or failed; a guild without one (or every guild,
+    with STARTUP_AUDIT) gets a full sweep.
+    """
+    by_guild = group_by_guild(active_keys)
+    for guild_id in GUILD_IDS:
+        wanted = set(by_guild.get(guild_id, ()))
+        if STARTUP_AUDIT or not role_ledger.known_guild(guild_id):
+            get_reconciler(bot, guild_id).set_active(wanted)
+            continue
+        applied = role_ledger.holders(guild_id)
+        changes = {user_id: True for user_id in wanted - applied}
+        changes.update((user_id, False) for user_id in applied - wanted)
+        changes.update((user_id, user_id in wanted) for user_id in role_ledger.unsettled(guild_id))
+        logger.info(f"[Role] Guild {guild_id}: resuming from the role ledger with {len(changes)} change(s)")
+        if changes:
+            get_reconciler(bot, guild_id).apply_changes(changes)
+
+def due_retries(active_keys) -> dict:
+    """
+    (guild_id, user_id) -> should_have_role for every transient failure whose
+    backoff has passed. Each is marked in flight until its outcome is recorded,
+    so later ticks don't send it again meanwhile.
+    """
+    now = time.monotonic()
+    changes = {}
+    for guild_id, retries in _retries.items():
+        for user_id, (attempts, due) in retries.items():
+            if due <= now:
+                changes[(guild_id, user_id)] = (guild_id, user_id) in active_keys
+                retries[user_id] = (attempts, now + RETRY_MAX_SECONDS)
+    return changes
+
+def next_retry_in() -> float | None:
+    """Seconds until the next transient failure is due to be sent again, or None if there is none."""
+    dues = [due for retries in _retries.values() for _, due in retries.values()]
+    return max(0.0, min(dues) - time.monotonic()) if dues else None
+
+def submit_changes(bot, changes):
+    """Hand per-user role changes ((guild_id, user_id) -> should_have_role) to their guilds' workers."""
+    by_guild = {}
+    for (guild_id, user_id), should_have in changes.items():
+        if guild_id in GUILD_IDS:
+            by_guild.setdefault(guild_id, {})[user_id] = should_have
+    for guild_id, guild_changes in by_guild.items():
+        get_reconciler(bot, guild_id).apply_changes(guild_changes)
@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+from app.utils.time_utils import (
+    DAY_NAMES,
+    days_to_mask,
+    get_tz,
+    mask_to_days,
+    minutes_to_time_str,
+    parse_days_input,
+    parse_time_input,
+)
+
+# Roster columns, in export order. timezone is optional on import.
+FIELDS = ("user_id", "start", "end", "days", "timezone")
+DEFAULT_TIMEZONE = "Australia/Sydney"
+
+class RosterError(ValueError):
+    """A roster that can't be imported; errors lists one message per bad row."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid row(s)")
+        self.errors = errors
+
+def _records(text: str, fmt: str):
+    """(line_or_index, dict) for each record. JSON may be an array or one object per line."""
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        missing = {"user_id", "start", "end", "days"} - set(reader.fieldnames or ())
+        if missing:
+            raise RosterError([f"CSV header is missing: {', '.join(sorted(missing))}"])
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "json":
+        stripped = text.lstrip()
+        if stripped.startswith("["):
+            for i, record in enumerate(json.loads(stripped), start=1):
+                yield i, record
+        else:
+            for i, line in enumerate(io.StringIO(text), start=1):
+                if line.strip():
+                    yield i, json.loads(line)
+    else:
+        raise ValueError(f"Unknown roster format: {fmt}. Use csv or json.")
+
+def _parse_record(record) -> tuple:
+    """(user_id, timezone, start_min, end_min, days_mask); raises ValueError with a friendly message."""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object with user_id, start, end, days")
+    if record.get(None):  # csv.DictReader's bucket for cells beyond the header
+        raise ValueError('too many columns; put days in quotes, e.g. "mon,tue,wed"')
+    try:
+        user_id = int(str(record.get("user_id", "")).strip())
+    except ValueError:
+        raise ValueError(f"Invalid user_id: {record.get('user_id')!r}") from None
+    start_min = parse_time_input(str(record.get("start") or ""))
+    end_min = parse_time_input(str(record.get("end") or ""))
+    days = record.get("days")
+    if isinstance(days, list):
+        days = ",".join(str(d) for d in days)
+    days_mask = days_to_mask(parse_days_input(str(days or "")))
+    timezone = str(record.get("timezone") or DEFAULT_TIMEZONE).strip()
+    try:
+        get_tz(timezone)
+    except (KeyError, ValueError):
+        raise ValueError(f"Unknown time zone: {timezone}") from None
+    return user_id, timezone, start_min, end_min, days_mask
+
+def parse_roster(text: str, fmt: str, skip_invalid=False):
+    """
+    Validate a CSV or JSON roster with the same rules as /setwork. Returns
+    (rows, errors) where rows are (user_id, timezone, start_min, end_min,
+    days_mask), last one wins per user. Raises RosterError if any row is bad,
+    unless skip_invalid, in which case bad rows are only listed in errors.
+    """
+    rows = {}
+    errors = []
+    try:
+        for where, record in _records(text, fmt):
+            try:
+                row = _parse_record(record)
+            except ValueError as e:
+                errors.append(f"{'line' if fmt == 'csv' else 'record'} {where}: {e}")
+                continue
+            rows[row[0]] = row
+    except (json.JSONDecodeError, csv.Error) as e:
+        raise RosterError([f"Could not read {fmt.upper()}: {e}"]) from None
+    if errors and not skip_invalid:
+        raise RosterError(errors)
+    return list(rows.values()), errors
+
+def export_roster(schedules, fmt: str) -> str:
+    """Schedules rows as a roster that parse_roster reads back unchanged."""
+    records = [
+        {
+            "user_id": row["user_id"],
+            "start": minutes_to_time_str(row["start_min"]),
+            "end": minutes_to_time_str(row["end_min"]),
+            "days": ",".join(DAY_NAMES[d].lower() for d in mask_to_days(row["days_mask"])),
+            "timezone": row["timezone"],
+        }
+        for row in sorted(schedules, key=lambda row: row["user_id"])
+    ]
+    if fmt == "json":
+        return json.dumps(records, indent=2) + "\n"
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(records)
+    return out.getvalue()
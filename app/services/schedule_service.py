@@ -1,28 +1,76 @@
-from app.db.schedule import get_all_schedules
-from app.utils.time_utils import should_be_on_shift, to_time_obj, parse_days
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from app.core.config import ACTIVE_USERS_BACKEND
+from app.core.logger import logger
+from app.db import repository
+from app.db.schedule import get_compiled_schedules_working_on
+from app.utils.time_utils import (
+    CompiledSchedule,
+    compile_schedule,
+    is_on_shift,
+    should_be_on_shift,
+    get_next_role_change_utc,
+    next_local_midnight_utc,
+)
+from app.services import shift_index, shift_matrix
+from datetime import datetime, timezone
 
-def get_active_users():
-    now_utc = datetime.utcnow()
+if ACTIVE_USERS_BACKEND == "numpy" and shift_matrix.np is None:
+    logger.warning("[Schedule] ACTIVE_USERS_BACKEND=numpy but numpy is not installed; using the scalar backend.")
+
+def _compiled(schedule) -> CompiledSchedule:
+    return schedule if isinstance(schedule, CompiledSchedule) else compile_schedule(schedule)
+
+def is_user_active(schedule, now_utc: datetime) -> bool:
+    """Should this schedule (row or CompiledSchedule) hold the role at now_utc (aware UTC)?"""
+    return is_on_shift(_compiled(schedule), now_utc)
+
+def get_active_users(now_utc: datetime | None = None):
+    """(guild_id, user_id) keys of every schedule that should hold the role at now_utc."""
+    now_utc = now_utc or datetime.now(timezone.utc)
+    if ACTIVE_USERS_BACKEND == "numpy" and shift_matrix.np is not None:
+        return shift_matrix.get_active_users(now_utc)
+    if ACTIVE_USERS_BACKEND == "index":
+        active = shift_index.get_active_users(now_utc)
+        if active is not None:
+            return active
+    return _get_active_users_scalar(now_utc)
+
+def _get_active_users_scalar(now_utc: datetime):
+    now_ts = now_utc.timestamp()
+    local_now = {}  # tz -> (local time, weekday); most schedules share a handful of zones
     active = []
 
-    for row in get_all_schedules():
-        tz = ZoneInfo(row["timezone"])
-        now_local = now_utc.astimezone(tz)
+    # Local weekdays are within a day of UTC's in every zone, so nobody else can be on shift now
+    weekday = now_utc.weekday()
+    for cs in get_compiled_schedules_working_on({(weekday + d) % 7 for d in (-1, 0, 1)}):
+        local = local_now.get(cs.tz)
+        if local is None:
+            now_local = now_utc.astimezone(cs.tz)
+            local = local_now[cs.tz] = (now_local, now_local.weekday())
+        now_local, weekday = local
 
-        days = parse_days(row["days"])
-        if now_local.weekday() not in days:
+        if not cs.days_mask >> weekday & 1:
             continue
+        if cs.sick_until is not None and now_ts < cs.sick_until:
+            continue
+        if should_be_on_shift(now_local, cs.start_min, cs.end_min):
+            active.append(cs.key)
+    return active
 
-        if row["sick_until"]:
-            sick_until = datetime.fromisoformat(row["sick_until"])
-            if now_utc < sick_until:
-                continue
-
-        start = to_time_obj(row["start_time"])
-        end = to_time_obj(row["end_time"])
+async def fetch_active_users(now_utc: datetime | None = None):
+    """get_active_users() on a database worker thread, for use inside coroutines."""
+    return await repository.run(get_active_users, now_utc)
 
-        if should_be_on_shift(now_local, start, end):
-            active.append(row["user_id"])
-    return active
\ No newline at end of file
+def get_next_transition(schedule, now_utc: datetime):
+    """
+    Return (active_now, next_check_utc) for one schedule (row or CompiledSchedule).
+    active_now matches get_active_users; next_check_utc is the next instant it may flip.
+    Overnight shifts are also checked at local midnight, because the work-day
+    test in is_user_active uses the local weekday.
+    """
+    cs = _compiled(schedule)
+    active = is_on_shift(cs, now_utc)
+    _, next_utc = get_next_role_change_utc(cs, now_utc)
+    if cs.overnight:
+        midnight = next_local_midnight_utc(now_utc, cs.tz)
+        next_utc = min(next_utc, midnight) if next_utc else midnight
+    return active, next_utc
@@ -0,0 +1,175 @@
+import threading
+from datetime import datetime
+
+from app.db.schedule_store import schedule_store
+
+MINUTES_PER_DAY = 1440
+
+class _ZoneIndex:
+    """
+    Minute-of-week index for one time zone, stored as minute-of-day buckets
+    of shift windows plus (window, weekday) -> (guild_id, user_id) keys. A window is a
+    (start_min, end_min) pair; users and weekdays sharing a shift pattern
+    share one bucket entry, so building and updating cost O(distinct windows)
+    rather than O(users x shift length).
+    """
+
+    def __init__(self):
+        self.buckets = {}  # minute of day -> windows on shift for that whole minute
+        self.boundaries = {}  # minute of day -> windows whose inclusive end is exactly hh:mm:00
+        self.users = {}  # (window, weekday) -> schedule keys
+        self.slots = {}  # window -> number of (window, weekday) slots with users
+
+    @staticmethod
+    def _coverage(window):
+        """
+        Minutes of the day a window covers, plus its end-boundary minute.
+        Matches should_be_on_shift: the weekday is the local day at the instant,
+        so an overnight window is the start..midnight and midnight..end parts of
+        that same day, and never carries over into the next weekday.
+        """
+        start, end = window
+        if start <= end:
+            return list(range(start, end)), end
+        return list(range(start, MINUTES_PER_DAY)) + list(range(0, end)), end
+
+    def add(self, window, weekday, key):
+        slot = (window, weekday)
+        members = self.users.get(slot)
+        if members is None:
+            members = self.users[slot] = set()
+            if window not in self.slots:
+                minutes, boundary = self._coverage(window)
+                for m in minutes:
+                    self.buckets.setdefault(m, set()).add(window)
+                self.boundaries.setdefault(boundary, set()).add(window)
+            self.slots[window] = self.slots.get(window, 0) + 1
+        members.add(key)
+
+    def remove(self, window, weekday, key):
+        slot = (window, weekday)
+        members = self.users.get(slot)
+        if members is None:
+            return
+        members.discard(key)
+        if members:
+            return
+        del self.users[slot]
+        self.slots[window] -= 1
+        if self.slots[window]:
+            return
+        del self.slots[window]
+        minutes, boundary = self._coverage(window)
+        for table, keys in ((self.buckets, minutes), (self.boundaries, [boundary])):
+            for m in keys:
+                windows = table[m]
+                windows.discard(window)
+                if not windows:
+                    del table[m]
+
+    def query(self, minute_of_week, at_boundary):
+        weekday, minute = divmod(minute_of_week, MINUTES_PER_DAY)
+        windows = self.buckets.get(minute, ())
+        if at_boundary and minute in self.boundaries:
+            windows = set(windows) | self.boundaries[minute]
+        for window in windows:
+            members = self.users.get((window, weekday))
+            if members:
+                yield from members
+
+class ShiftIndex:
+    """
+    Per-time-zone minute-of-week index of who is on shift. Lookups cost
+    O(windows in the bucket + result size); sick_until is applied as an
+    overlay on the result. Kept current incrementally by listening to the
+    schedule store.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zones = {}  # tz -> _ZoneIndex
+        self._placed = {}  # key -> (tz, window, weekdays) as indexed
+        self._sick = {}  # key -> sick_until epoch seconds
+        self._stale = True
+
+    def _place(self, cs):
+        window = (cs.start_min, cs.end_min)
+        weekdays = [d for d in range(7) if cs.works_on(d)]
+        zone = self._zones.get(cs.tz)
+        if zone is None:
+            zone = self._zones[cs.tz] = _ZoneIndex()
+        for d in weekdays:
+            zone.add(window, d, cs.key)
+        self._placed[cs.key] = (cs.tz, window, weekdays)
+        if cs.sick_until is not None:
+            self._sick[cs.key] = cs.sick_until
+
+    def _unplace(self, key):
+        placed = self._placed.pop(key, None)
+        self._sick.pop(key, None)
+        if placed is None:
+            return
+        tz, window, weekdays = placed
+        for d in weekdays:
+            self._zones[tz].remove(window, d, key)
+
+    def rebuild(self, schedules):
+        with self._lock:
+            self._zones = {}
+            self._placed = {}
+            self._sick = {}
+            for cs in schedules:
+                self._place(cs)
+            self._stale = False
+
+    def on_store_change(self, key, compiled):
+        """Schedule store listener: one schedule changed, or (None, None) for a full reload."""
+        with self._lock:
+            if key is None:
+                self._stale = True
+                return
+            self._unplace(key)
+            if compiled is not None:
+                self._place(compiled)
+
+    @property
+    def stale(self):
+        return self._stale
+
+    def active_at(self, now_utc: datetime) -> list[tuple[int, int]]:
+        now_ts = now_utc.timestamp()
+        active = []
+        with self._lock:
+            for tz, zone in self._zones.items():
+                now_local = now_utc.astimezone(tz)
+                minute = now_local.weekday() * MINUTES_PER_DAY + now_local.hour * 60 + now_local.minute
+                at_boundary = not now_local.second and not now_local.microsecond
+                for key in zone.query(minute, at_boundary):
+                    sick_until = self._sick.get(key)
+                    if sick_until is None or now_ts >= sick_until:
+                        active.append(key)
+        return active
+
+_index: ShiftIndex | None = None
+_index_lock = threading.Lock()
+
+def get_shift_index() -> ShiftIndex | None:
+    """The shared index, built from the schedule store on first use. None if the store isn't loaded."""
+    global _index
+    if not schedule_store.loaded:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = ShiftIndex()
+            schedule_store.add_listener(_index.on_store_change)
+        while _index.stale:
+            version = schedule_store.version
+            _index.rebuild(schedule_store.all_compiled())
+            if schedule_store.version != version:
+                # A write between the snapshot and the rebuild may have been overwritten by it
+                _index.on_store_change(None, None)
+        return _index
+
+def get_active_users(now_utc: datetime) -> list[tuple[int, int]] | None:
+    index = get_shift_index()
+    return index.active_at(now_utc) if index is not None else None
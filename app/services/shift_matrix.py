@@ -0,0 +1,111 @@
+import threading
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # optional: only needed for ACTIVE_USERS_BACKEND=numpy
+    np = None
+
+from app.db.schedule import get_all_compiled_schedules
+from app.db.schedule_store import schedule_store
+
+# Stand-in for "not sick": every instant is >= this
+_NO_SICK = -(2 ** 62)
+# Instants evaluated per broadcast in active_many(), to bound the (instants x users) temporaries
+_CHUNK = 256
+
+class _ZoneColumns:
+    """Columnar schedules for one time zone."""
+
+    __slots__ = ("tz", "positions", "days_mask", "start_min", "end_min", "overnight", "sick_until")
+
+    def __init__(self, tz, schedules):
+        self.tz = tz
+        self.positions = np.array([pos for pos, _ in schedules], dtype=np.int64)
+        self.days_mask = np.array([cs.days_mask for _, cs in schedules], dtype=np.uint8)
+        self.start_min = np.array([cs.start_min for _, cs in schedules], dtype=np.int16)
+        self.end_min = np.array([cs.end_min for _, cs in schedules], dtype=np.int16)
+        self.overnight = self.start_min > self.end_min
+        self.sick_until = np.array(
+            [_NO_SICK if cs.sick_until is None else cs.sick_until for _, cs in schedules], dtype=np.int64
+        )
+
+    def on_shift(self, weekday, minute, at_boundary, now_ts):
+        """
+        Boolean mask (instants x users) for the given per-instant columns
+        (each shaped (k, 1)). Mirrors is_on_shift / should_be_on_shift exactly.
+        """
+        on_day = (self.days_mask >> weekday.astype(np.uint8)) & 1 == 1
+        not_sick = self.sick_until <= now_ts
+        after_start = minute >= self.start_min
+        before_end = (minute < self.end_min) | ((minute == self.end_min) & at_boundary)
+        in_window = np.where(self.overnight, after_start | before_end, after_start & before_end)
+        return on_day & not_sick & in_window
+
+class ShiftMatrix:
+    """
+    Schedules as NumPy columns grouped by time zone. Answers "who is on shift
+    at T" with a few array operations per zone, for one instant or many.
+    Results come back in the same order as get_all_compiled_schedules().
+    """
+
+    def __init__(self, schedules):
+        if np is None:
+            raise RuntimeError("numpy is not installed; use ACTIVE_USERS_BACKEND=scalar")
+        by_tz = {}
+        for pos, cs in enumerate(schedules):
+            by_tz.setdefault(cs.tz, []).append((pos, cs))
+        self.guild_ids = np.array([cs.guild_id for cs in schedules], dtype=np.int64)
+        self.user_ids = np.array([cs.user_id for cs in schedules], dtype=np.int64)
+        self.zones = [_ZoneColumns(tz, group) for tz, group in by_tz.items()]
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def _local_columns(self, tz, instants):
+        locals_ = [t.astimezone(tz) for t in instants]
+        weekday = np.array([t.weekday() for t in locals_], dtype=np.int64)[:, None]
+        minute = np.array([t.hour * 60 + t.minute for t in locals_], dtype=np.int16)[:, None]
+        at_boundary = np.array([not t.second and not t.microsecond for t in locals_], dtype=bool)[:, None]
+        return weekday, minute, at_boundary
+
+    def active_many(self, instants: list[datetime]) -> list[list[tuple[int, int]]]:
+        """Active (guild_id, user_id) keys for each aware UTC instant, e.g. a whole day at minute resolution."""
+        results = []
+        for i in range(0, len(instants), _CHUNK):
+            chunk = instants[i:i + _CHUNK]
+            now_ts = np.array([t.timestamp() for t in chunk], dtype=np.float64)[:, None]
+            hits = [[] for _ in chunk]
+            for zone in self.zones:
+                weekday, minute, at_boundary = self._local_columns(zone.tz, chunk)
+                mask = zone.on_shift(weekday, minute, at_boundary, now_ts)
+                for row, row_mask in enumerate(mask):
+                    hits[row].append(zone.positions[row_mask])
+            for zone_hits in hits:
+                positions = np.sort(np.concatenate(zone_hits)) if zone_hits else np.empty(0, dtype=np.int64)
+                results.append(list(zip(self.guild_ids[positions].tolist(), self.user_ids[positions].tolist())))
+        return results
+
+    def active_at(self, now_utc: datetime) -> list[tuple[int, int]]:
+        return self.active_many([now_utc])[0]
+
+    def count_many(self, instants: list[datetime]) -> list[int]:
+        """How many users are on shift at each instant (for forecasting)."""
+        return [len(ids) for ids in self.active_many(instants)]
+
+_cache_lock = threading.Lock()
+_cached: tuple[int, ShiftMatrix] | None = None
+
+def get_shift_matrix() -> ShiftMatrix:
+    """ShiftMatrix for the current schedules, rebuilt only when the schedule store changes."""
+    global _cached
+    with _cache_lock:
+        if not schedule_store.loaded:
+            return ShiftMatrix(get_all_compiled_schedules())
+        version = schedule_store.version
+        if _cached is None or _cached[0] != version:
+            _cached = (version, ShiftMatrix(get_all_compiled_schedules()))
+        return _cached[1]
+
+def get_active_users(now_utc: datetime) -> list[tuple[int, int]]:
+    return get_shift_matrix().active_at(now_utc)
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timezone
+from app.db.schedule import get_compiled_schedule
+from app.services.schedule_service import fetch_active_users
+from app.utils.time_utils import get_next_role_change_utc
+
+class ActiveSnapshot:
+    """
+    Who should hold the role as of taken_at, as published by the scheduler.
+    Read-only commands serve from the latest snapshot instead of evaluating
+    every schedule themselves. Per-user next changes are computed at
+    taken_at on first request and shared by every later reader; an entry is
+    recomputed if that user's schedule has changed since.
+    """
+
+    __slots__ = ("taken_at", "active", "_by_guild", "_next")
+
+    def __init__(self, taken_at: datetime, active_keys):
+        self.taken_at = taken_at
+        self.active = frozenset(active_keys)
+        self._by_guild = {}  # guild_id -> sorted user_ids, built on first use
+        self._next = {}  # key -> (CompiledSchedule it was computed from, on_work, next_change_utc)
+
+    def is_active(self, guild_id, user_id) -> bool:
+        return (guild_id, user_id) in self.active
+
+    def active_in_guild(self, guild_id) -> list[int]:
+        users = self._by_guild.get(guild_id)
+        if users is None:
+            users = self._by_guild[guild_id] = sorted(u for g, u in self.active if g == guild_id)
+        return users
+
+    def next_change(self, guild_id, user_id):
+        """(on_work, next_change_utc) at taken_at, as get_next_role_change_utc; None without a schedule."""
+        cs = get_compiled_schedule(guild_id, user_id)
+        if cs is None:
+            return None
+        entry = self._next.get(cs.key)
+        if entry is None or entry[0] is not cs:
+            entry = self._next[cs.key] = (cs, *get_next_role_change_utc(cs, self.taken_at))
+        return entry[1], entry[2]
+
+    def age_seconds(self, now_utc: datetime | None = None) -> float:
+        return ((now_utc or datetime.now(timezone.utc)) - self.taken_at).total_seconds()
+
+_current: ActiveSnapshot | None = None
+_building: asyncio.Task | None = None
+
+def publish(taken_at: datetime, active_keys) -> ActiveSnapshot:
+    """Called by the scheduler after each evaluation. An older evaluation never replaces a newer one."""
+    global _current
+    if _current is None or taken_at >= _current.taken_at:
+        _current = ActiveSnapshot(taken_at, active_keys)
+    return _current
+
+def current() -> ActiveSnapshot | None:
+    return _current
+
+async def get_snapshot() -> ActiveSnapshot:
+    """The latest snapshot; before the scheduler's first one, a single shared evaluation."""
+    global _building
+    if _current is not None:
+        return _current
+    if _building is None or _building.done():
+        _building = asyncio.get_running_loop().create_task(_evaluate())
+    return await asyncio.shield(_building)
+
+async def _evaluate() -> ActiveSnapshot:
+    now = datetime.now(timezone.utc)
+    return publish(now, await fetch_active_users(now))
@@ -1,12 +1,25 @@
+import math
+from functools import lru_cache
 from datetime import datetime, time, timedelta, timezone
 from zoneinfo import ZoneInfo
 
-def should_be_on_shift(now_local: datetime, start_time: time, end_time: time):
-    current = now_local.time()
+def should_be_on_shift(now_local: datetime, start_time: time | int, end_time: time | int):
+    """start_time/end_time are time objects or minutes since midnight (as in CompiledSchedule)."""
+    if isinstance(start_time, time):
+        current = now_local.time()
+        if start_time <= end_time:
+            return start_time <= current <= end_time
+        else:
+            return current >= start_time or current <= end_time
+
+    # Same comparison in minutes: the end minute only counts at exactly hh:mm:00.000000
+    minute = now_local.hour * 60 + now_local.minute
+    after_start = minute >= start_time
+    before_end = minute < end_time or (minute == end_time and not now_local.second and not now_local.microsecond)
     if start_time <= end_time:
-        return start_time <= current <= end_time
+        return after_start and before_end
     else:
-        return current >= start_time or current <= end_time
+        return after_start or before_end
 
 def to_time_obj(time_str: str):
     return datetime.strptime(time_str, "%H:%M").time()
@@ -14,6 +27,26 @@ def to_time_obj(time_str: str):
 def parse_days(days_str: str):
     return [int(d) for d in days_str.split(",")]
 
+def time_to_minutes(time_str: str) -> int:
+    """'09:30' -> 570 (minutes since midnight, as stored in the schedules table)."""
+    t = to_time_obj(time_str)
+    return t.hour * 60 + t.minute
+
+def minutes_to_time_str(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def days_to_mask(days_str: str) -> int:
+    """'0,2' -> 0b101 (bit 0 = Mon). Raises ValueError for days outside 0-6."""
+    mask = 0
+    for d in parse_days(days_str):
+        if not 0 <= d <= 6:
+            raise ValueError(f"Invalid day: {d}")
+        mask |= 1 << d
+    return mask
+
+def mask_to_days(mask: int) -> list[int]:
+    return [d for d in range(7) if mask >> d & 1]
+
 DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 DAY_ABBREV_TO_INT = {name.lower()[:3]: i for i, name in enumerate(DAY_NAMES)}
 
@@ -32,67 +65,159 @@ def parse_days_input(input_str: str) -> str:
         raise ValueError("Specify at least one day (e.g. mon,tue,wed or 0,1,2).")
     return ",".join(str(d) for d in sorted(set(out)))
 
-def format_days_display(days_str: str) -> str:
-    """Turn stored '0,1,2' into 'Mon, Tue, Wed'."""
+def parse_time_input(input_str: str) -> int:
+    """Parse user input like '09:00' into minutes since midnight."""
+    try:
+        return time_to_minutes(input_str.strip())
+    except ValueError:
+        raise ValueError(f"Invalid time: {input_str}. Use 24-hour HH:MM, e.g. 09:00 or 17:30.") from None
+
+def format_days_display(days: str | int) -> str:
+    """Turn '0,1,2' or the bitmask 0b111 into 'Mon, Tue, Wed'."""
     try:
-        nums = parse_days(days_str)
+        nums = mask_to_days(days) if isinstance(days, int) else parse_days(days)
         return ", ".join(DAY_NAMES[i] for i in nums)
     except (ValueError, IndexError):
-        return days_str
+        return str(days)
+
 
+def parse_sick_until(value: str | None) -> datetime | None:
+    """Parse an ISO sick_until string (the pre-migration format); naive values are UTC."""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def next_local_midnight_utc(now_utc: datetime, tz: ZoneInfo) -> datetime:
+    """Start of the next local day in tz, as UTC."""
+    tomorrow = now_utc.astimezone(tz).date() + timedelta(days=1)
+    return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=tz).astimezone(timezone.utc)
+
+
+@lru_cache(maxsize=None)
+def get_tz(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+class CompiledSchedule:
+    """
+    A schedule row parsed once: weekday bitmask (bit 0 = Mon), start/end as
+    minutes since local midnight, cached tzinfo, and sick_until as epoch
+    seconds (rounded up) or None. key is (guild_id, user_id), the table's
+    primary key.
+    """
 
-def get_next_role_change_utc(row, now_utc: datetime):
+    __slots__ = ("guild_id", "user_id", "tz", "days_mask", "start_min", "end_min", "sick_until")
+
+    def __init__(self, guild_id, user_id, tz: ZoneInfo, days_mask: int, start_min: int, end_min: int, sick_until: int | None):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.tz = tz
+        self.days_mask = days_mask
+        self.start_min = start_min
+        self.end_min = end_min
+        self.sick_until = sick_until
+
+    def __repr__(self):
+        return (
+            f"CompiledSchedule(guild_id={self.guild_id}, user_id={self.user_id}, tz={self.tz.key}, days_mask={self.days_mask:#09b}, "
+            f"start_min={self.start_min}, end_min={self.end_min}, sick_until={self.sick_until})"
+        )
+
+    @property
+    def key(self) -> tuple[int, int]:
+        return self.guild_id, self.user_id
+
+    def works_on(self, weekday: int) -> bool:
+        return bool(self.days_mask >> weekday & 1)
+
+    @property
+    def overnight(self) -> bool:
+        return self.start_min > self.end_min
+
+
+def sick_until_to_epoch(value: str | None) -> int | None:
+    """ISO sick_until string -> epoch seconds, rounded up so a sick period is never shortened."""
+    sick_until = parse_sick_until(value)
+    return math.ceil(sick_until.timestamp()) if sick_until else None
+
+
+def compile_schedule(row) -> CompiledSchedule:
+    """Build the evaluation form of a schedules row. Raises KeyError for an unknown time zone."""
+    return CompiledSchedule(
+        row["guild_id"],
+        row["user_id"],
+        get_tz(row["timezone"]),
+        row["days_mask"],
+        row["start_min"],
+        row["end_min"],
+        row["sick_until"],
+    )
+
+
+def is_on_shift(cs: CompiledSchedule, now_utc: datetime) -> bool:
+    """Should this schedule hold the role at now_utc (aware UTC)?"""
+    now_local = now_utc.astimezone(cs.tz)
+    if not cs.works_on(now_local.weekday()):
+        return False
+    if cs.sick_until is not None and now_utc.timestamp() < cs.sick_until:
+        return False
+    return should_be_on_shift(now_local, cs.start_min, cs.end_min)
+
+
+def get_next_role_change_utc(schedule, now_utc: datetime):
     """
-    Given a schedule row and current UTC time, return (on_work_now, next_change_utc).
+    Given a schedule (row or CompiledSchedule) and current UTC time, return (on_work_now, next_change_utc).
     next_change_utc is when the role would be added or removed (or None).
     """
-    tz = ZoneInfo(row["timezone"])
+    cs = schedule if isinstance(schedule, CompiledSchedule) else compile_schedule(schedule)
+    tz = cs.tz
     now_local = now_utc.astimezone(tz)
-    start_t = to_time_obj(row["start_time"])
-    end_t = to_time_obj(row["end_time"])
-    work_days = parse_days(row["days"])
 
-    if row["sick_until"]:
-        sick_until = datetime.fromisoformat(row["sick_until"])
-        if now_utc < sick_until:
-            return (False, sick_until)
+    if cs.sick_until is not None and now_utc.timestamp() < cs.sick_until:
+        return (False, datetime.fromtimestamp(cs.sick_until, timezone.utc))
 
-    if now_local.weekday() not in work_days:
-        next_start = _next_shift_start_local(now_local, work_days, start_t, tz)
+    if not cs.works_on(now_local.weekday()):
+        next_start = _next_shift_start_local(now_local, cs.days_mask, cs.start_min, tz)
         return (False, next_start.astimezone(timezone.utc) if next_start else None)
 
-    on_work_now = should_be_on_shift(now_local, start_t, end_t)
+    on_work_now = should_be_on_shift(now_local, cs.start_min, cs.end_min)
     if on_work_now:
-        end_dt = _current_shift_end_local(now_local, start_t, end_t, tz)
+        end_dt = _current_shift_end_local(now_local, cs.start_min, cs.end_min)
         return (True, end_dt.astimezone(timezone.utc) if end_dt else None)
     else:
-        next_start = _next_shift_start_local(now_local, work_days, start_t, tz)
+        next_start = _next_shift_start_local(now_local, cs.days_mask, cs.start_min, tz)
         return (False, next_start.astimezone(timezone.utc) if next_start else None)
 
 
-def _current_shift_end_local(now_local: datetime, start_t: time, end_t: time, tz: ZoneInfo) -> datetime | None:
+def _current_shift_end_local(now_local: datetime, start_min: int, end_min: int) -> datetime | None:
     """When does the current shift end (in local time)?"""
-    if start_t <= end_t:
-        end_dt = now_local.replace(hour=end_t.hour, minute=end_t.minute, second=0, microsecond=0)
+    end_h, end_m = divmod(end_min, 60)
+    if start_min <= end_min:
+        end_dt = now_local.replace(hour=end_h, minute=end_m, second=0, microsecond=0)
         if end_dt > now_local:
             return end_dt
         return None
     else:
-        if now_local.time() >= start_t:
-            end_dt = (now_local + timedelta(days=1)).replace(hour=end_t.hour, minute=end_t.minute, second=0, microsecond=0)
+        if now_local.hour * 60 + now_local.minute >= start_min:
+            end_dt = (now_local + timedelta(days=1)).replace(hour=end_h, minute=end_m, second=0, microsecond=0)
         else:
-            end_dt = now_local.replace(hour=end_t.hour, minute=end_t.minute, second=0, microsecond=0)
+            end_dt = now_local.replace(hour=end_h, minute=end_m, second=0, microsecond=0)
         return end_dt if end_dt > now_local else None
 
 
-def _next_shift_start_local(now_local: datetime, work_days: list[int], start_t: time, tz: ZoneInfo) -> datetime | None:
+def _next_shift_start_local(now_local: datetime, days_mask: int, start_min: int, tz: ZoneInfo) -> datetime | None:
     """Next moment a shift starts (local time), strictly after now_local."""
+    start_h, start_m = divmod(start_min, 60)
     for d in range(8):
         candidate_date = (now_local.date() + timedelta(days=d))
-        if candidate_date.weekday() not in work_days:
+        if not days_mask >> candidate_date.weekday() & 1:
             continue
         start_dt = datetime(candidate_date.year, candidate_date.month, candidate_date.day,
-                           start_t.hour, start_t.minute, start_t.second or 0, tzinfo=tz)
+                           start_h, start_m, 0, tzinfo=tz)
         if start_dt > now_local:
             return start_dt
     return None
@@ -0,0 +1,25 @@
+"""Setup shared by the benchmark and soak harnesses."""
+import os
+import subprocess
+
+def guild_ids(count):
+    return [1000 * (i + 1) for i in range(count)]
+
+def configure_env(db_path, guilds, settings=None, defaults=None):
+    """
+    Point the app at a scratch database and `guilds` synthetic guilds. settings
+    are set as given; defaults only where the environment doesn't set them.
+    Must run before any app module is imported: config is read at import time.
+    """
+    os.environ["GUILD_IDS"] = ",".join(str(g) for g in guild_ids(guilds))
+    os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+    os.environ["DATABASE_PATH"] = db_path
+    os.environ.update(settings or {})
+    for name, value in (defaults or {}).items():
+        os.environ.setdefault(name, value)
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
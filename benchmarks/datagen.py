@@ -0,0 +1,82 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+TIMEZONES = [
+    "Australia/Sydney",
+    "Australia/Perth",
+    "Pacific/Auckland",
+    "Asia/Kolkata",
+    "Asia/Tokyo",
+    "Europe/London",
+    "Europe/Berlin",
+    "America/New_York",
+    "America/Los_Angeles",
+    "UTC",
+]
+
+# (start_min, end_min): office hours, early/late shifts, overnight shifts
+SHIFTS = [
+    (9 * 60, 17 * 60),
+    (8 * 60 + 30, 17 * 60 + 30),
+    (6 * 60, 14 * 60),
+    (14 * 60, 22 * 60),
+    (22 * 60, 6 * 60),
+    (23 * 60, 7 * 60),
+    (7 * 60, 19 * 60),
+    (19 * 60, 7 * 60),
+]
+
+DAY_PATTERNS = [0b0011111, 0b1100000, 0b1111111, 0b0010101, 0b0101010, 0b0001111, 0b1111000]
+
+def generate_schedules(count, now=None, seed=0, sick_ratio=0.1, random_shift_ratio=0.1, guild_ids=(1,)):
+    """
+    Rows (guild_id, user_id, timezone, start_min, end_min, days_mask, sick_until)
+    for the schedules table: mixed time zones, common and overnight shifts, some
+    quarter-hour custom shifts, and a share of users sick within +/- 48h of now.
+    Users are spread round-robin over guild_ids.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        if rng.random() < random_shift_ratio:
+            start, end = rng.randrange(0, 1440, 15), rng.randrange(0, 1440, 15)
+        else:
+            start, end = rng.choice(SHIFTS)
+        sick_until = None
+        if rng.random() < sick_ratio:
+            sick_until = math.ceil((now + timedelta(minutes=rng.randint(-48 * 60, 48 * 60))).timestamp())
+        rows.append((
+            guild_ids[i % len(guild_ids)],
+            1_000_000 + i,
+            rng.choice(TIMEZONES),
+            start,
+            end,
+            rng.choice(DAY_PATTERNS),
+            sick_until,
+        ))
+    return rows
+
+def generate_soak_schedules(count, now=None, window_minutes=10, seed=0, guild_ids=(1,)):
+    """
+    Rows like generate_schedules, but every user's shift starts or ends within
+    window_minutes of now (in their own time zone), so a soak run of that
+    length sees a steady stream of role changes. Shifts run every day.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        tz = rng.choice(TIMEZONES)
+        local = now.astimezone(ZoneInfo(tz))
+        minute = local.hour * 60 + local.minute
+        boundary = (minute + rng.randint(1, window_minutes)) % 1440
+        length = rng.randint(window_minutes + 1, 8 * 60)
+        if rng.random() < 0.5:
+            start, end = boundary, (boundary + length) % 1440  # comes on during the run
+        else:
+            start, end = (boundary - length) % 1440, boundary  # goes off during the run
+        rows.append((guild_ids[i % len(guild_ids)], 1_000_000 + i, tz, start, end, 0b1111111, None))
+    return rows
@@ -0,0 +1,92 @@
+# In-memory stand-ins for the parts of discord.py that role_service touches.
+
+class FakeRole:
+    def __init__(self, role_id, name, position, guild):
+        self.id = role_id
+        self.name = name
+        self.position = position
+        self.guild = guild
+
+    @property
+    def members(self):
+        # Like discord.py: a scan of every cached member, so it costs O(guild size), not O(holders)
+        return [m for m in self.guild._members.values() if self in m.roles]
+
+    def __le__(self, other):
+        return self.position <= other.position
+
+    def __lt__(self, other):
+        return self.position < other.position
+
+    def __repr__(self):
+        return f"<FakeRole {self.name}>"
+
+class FakeMember:
+    def __init__(self, member_id, guild):
+        self.id = member_id
+        self.guild = guild
+        self.roles = []
+        self.display_name = f"user{member_id}"
+
+    @property
+    def top_role(self):
+        return max(self.roles, key=lambda r: r.position) if self.roles else self.guild.default_role
+
+    async def add_roles(self, role, **kwargs):
+        self.guild.api_calls += 1
+        if role not in self.roles:
+            self.roles.append(role)
+
+    async def remove_roles(self, role, **kwargs):
+        self.guild.api_calls += 1
+        if role in self.roles:
+            self.roles.remove(role)
+
+    def __repr__(self):
+        return f"<FakeMember {self.id}>"
+
+class FakeGuild:
+    def __init__(self, guild_id, member_ids, role_name, bot_user_id):
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.api_calls = 0
+        self.default_role = FakeRole(guild_id, "@everyone", 0, self)
+        self.role = FakeRole(guild_id + 1, role_name, 1, self)
+        bot_role = FakeRole(guild_id + 2, "bot", 10, self)
+        self.roles = [self.default_role, self.role, bot_role]
+        self._members = {member_id: FakeMember(member_id, self) for member_id in member_ids}
+        bot_member = self._members[bot_user_id] = FakeMember(bot_user_id, self)
+        bot_member.roles.append(bot_role)
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+    def give_role(self, member_ids):
+        """Set up initial role holders without counting API calls."""
+        for member_id in member_ids:
+            member = self._members[member_id]
+            if self.role not in member.roles:
+                member.roles.append(self.role)
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class FakeBot:
+    def __init__(self, guilds, bot_user_id):
+        self._guilds = {guild.id: guild for guild in guilds}
+        self.user = FakeUser(bot_user_id)
+
+    @property
+    def guilds(self):
+        return list(self._guilds.values())
+
+    def get_guild(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    async def wait_until_ready(self):
+        return None
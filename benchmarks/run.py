@@ -0,0 +1,181 @@
+"""
+Benchmarks for the scheduling and reconciliation hot paths.
+
+    python -m benchmarks.run                       # 1k, 10k, 100k users
+    python -m benchmarks.run --sizes 1000 5000 --out bench.json
+    python -m benchmarks.run --guilds 8            # users spread over 8 guilds
+
+Each size gets a synthetic schedules table (mixed time zones, overnight
+shifts, sick users) and in-memory fake guilds. Results are written as JSON
+so runs can be compared across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from benchmarks import common
+
+BOT_USER_ID = 42
+# The fake guild has no rate limits; don't let the executor invent one
+EXECUTOR_DEFAULTS = {
+    "ROLE_RATE_PER_SECOND": "1000000000",
+    "ROLE_RATE_BURST": "1000000000",
+    "ROLE_CONCURRENCY": "32",
+}
+
+def _summary(samples):
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "repeat": len(samples),
+    }
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+async def _atime(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+async def bench_size(size, repeat, extra_members, seed, guilds):
+    from app.core.config import ROLE_NAME
+    from app.db.database import get_connection
+    from app.db.schedule import get_all_schedules, get_all_compiled_schedules, load_schedule_store
+    from app.db.schedule_store import schedule_store
+    from app.services import shift_index, shift_matrix
+    from app.services.role_service import update_roles
+    from app.services.schedule_service import _get_active_users_scalar
+    from app.utils.time_utils import get_next_role_change_utc
+    from benchmarks.datagen import generate_schedules
+    from benchmarks.fakes import FakeBot, FakeGuild
+
+    guild_ids = common.guild_ids(guilds)
+    now = datetime.now(timezone.utc)
+    rows = generate_schedules(size, now=now, seed=seed, guild_ids=guild_ids)
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM schedules")
+        conn.executemany("INSERT INTO schedules VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    result = {"users": size, "guilds": guilds, "guild_members": size + extra_members // guilds * guilds}
+
+    schedule_store.invalidate()
+    result["get_all_schedules_sqlite"] = _time(get_all_schedules, repeat)
+    result["load_schedule_store"] = _time(load_schedule_store, 1)
+    result["get_all_schedules_memory"] = _time(get_all_schedules, repeat)
+
+    result["get_active_users_scalar"] = _time(lambda: _get_active_users_scalar(now), repeat)
+    if shift_matrix.np is not None:
+        result["shift_matrix_build"] = _time(lambda: shift_matrix.ShiftMatrix(get_all_compiled_schedules()), 1)
+        matrix = shift_matrix.get_shift_matrix()
+        result["get_active_users_numpy"] = _time(lambda: matrix.active_at(now), repeat)
+        day = [now + timedelta(minutes=m) for m in range(1440)]
+        result["numpy_day_forecast_1440_instants"] = _time(lambda: matrix.count_many(day), 1)
+    result["shift_index_build"] = _time(lambda: shift_index.ShiftIndex().rebuild(get_all_compiled_schedules()), 1)
+    index = shift_index.get_shift_index()
+    result["get_active_users_index"] = _time(lambda: index.active_at(now), repeat)
+
+    compiled = get_all_compiled_schedules()
+    result["get_next_role_change_utc_all"] = _time(lambda: [get_next_role_change_utc(cs, now) for cs in compiled], repeat)
+
+    active = _get_active_users_scalar(now)
+    result["active_users"] = len(active)
+
+    scheduled_ids = {guild_id: [] for guild_id in guild_ids}
+    for row in rows:
+        scheduled_ids[row[0]].append(row[1])
+    extra_ids = [2_000_000 + i for i in range(extra_members)]
+    rng = random.Random(seed)
+
+    # Cold: roughly half the scheduled members hold the role in the wrong state
+    cold_samples = []
+    api_calls = 0
+    for _ in range(repeat):
+        fake_guilds = []
+        for guild_id, ids in scheduled_ids.items():
+            guild = FakeGuild(guild_id, ids + extra_ids[:extra_members // guilds], ROLE_NAME, BOT_USER_ID)
+            guild.give_role(rng.sample(ids, len(ids) // 2))
+            fake_guilds.append(guild)
+        bot = FakeBot(fake_guilds, BOT_USER_ID)
+        start = time.perf_counter()
+        await update_roles(bot, active)
+        cold_samples.append(time.perf_counter() - start)
+        api_calls = sum(guild.api_calls for guild in fake_guilds)
+    result["update_roles_cold"] = {**_summary(cold_samples), "api_calls": api_calls}
+
+    # Steady state: roles already match, nothing to change
+    result["update_roles_steady"] = await _atime(lambda: update_roles(bot, active), repeat)
+
+    tick = result["get_active_users_scalar"]["median"] + result["update_roles_steady"]["median"]
+    result["steady_tick_seconds"] = tick
+    result["steady_tick_budget_fraction"] = tick / 60.0
+    return result
+
+async def main_async(args):
+    results = {}
+    for size in args.sizes:
+        print(f"Benchmarking {size} users...", file=sys.stderr)
+        results[str(size)] = await bench_size(size, args.repeat, args.extra_members, args.seed, args.guilds)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--extra-members", type=int, default=1_000, help="guild members without a schedule")
+    parser.add_argument("--guilds", type=int, default=1, help="spread users over this many guilds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        common.configure_env(os.path.join(tmp, "bench.db"), args.guilds, defaults=EXECUTOR_DEFAULTS)
+        from app.db import repository
+        from app.db.database import close_connections, init_db
+
+        init_db()
+        try:
+            results = asyncio.run(main_async(args))
+        finally:
+            repository.shutdown()
+            close_connections()
+
+    report = {
+        "commit": common.git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for size, r in results.items():
+        print(
+            f"{size:>7} users: active={r['active_users']:>6}  "
+            f"scalar={r['get_active_users_scalar']['median'] * 1000:8.2f}ms  "
+            f"index={r['get_active_users_index']['median'] * 1000:8.2f}ms  "
+            f"update_roles steady={r['update_roles_steady']['median'] * 1000:8.2f}ms  "
+            f"tick budget used={r['steady_tick_budget_fraction']:.2%}"
+        )
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
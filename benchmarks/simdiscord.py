@@ -0,0 +1,289 @@
+# A local stand-in for the Discord API, for load tests that need more than
+# benchmarks.fakes: role routes cost time and are rate limited like the real
+# ones, members are cached like discord.py caches them, and every role change
+# comes back as a member update, as it would over the gateway.
+
+import asyncio
+import random
+import time
+from collections import Counter
+import discord
+
+ROLE_ROUTE = "/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+INTERACTION_ROUTE = "/interactions/{interaction_id}/{token}/callback"
+
+class _Response:
+    """Just enough of aiohttp.ClientResponse for discord.HTTPException and the role executor."""
+
+    def __init__(self, status, reason, retry_after=None):
+        self.status = status
+        self.reason = reason
+        self.headers = {} if retry_after is None else {"Retry-After": f"{retry_after:.3f}"}
+
+class _Window:
+    """Fixed-window limit like Discord's buckets: limit requests, then 429 until the window resets."""
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self._reset_at = 0.0
+        self._used = 0
+
+    def hit(self, now) -> float | None:
+        """Count one request; returns seconds to wait if it is over the limit."""
+        if now >= self._reset_at:
+            self._reset_at = now + self.per
+            self._used = 0
+        if self._used >= self.limit:
+            return self._reset_at - now
+        self._used += 1
+        return None
+
+class SimDiscord:
+    """
+    The server side: REST latency, per-route and global rate limits, random
+    5xx errors on role routes, and a count of every call by route and status. Latency is
+    log-normal around latency_ms, which is close to what the real API shows.
+    """
+
+    def __init__(self, latency_ms=80.0, jitter=0.5, route_limit=5, route_per=1.0, global_limit=50, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.route_limit = route_limit
+        self.route_per = route_per
+        self.error_rate = error_rate
+        self.calls = Counter()  # (method route, status) -> count
+        self.role_changes = []  # (unix time, guild_id, user_id, has_role), in the order applied
+        self._global = _Window(global_limit, 1.0)
+        self._buckets = {}
+        self._rng = random.Random(seed)
+
+    def latency(self) -> float:
+        return self.latency_ms / 1000 * self._rng.lognormvariate(0, self.jitter)
+
+    async def request(self, method, route, major=None, limited=True):
+        """One REST call; raises discord.HTTPException on 429 or 5xx like discord.py does."""
+        now = time.monotonic()
+        retry_after = None
+        if limited:
+            bucket = self._buckets.get((method, route, major))
+            if bucket is None:
+                bucket = self._buckets[(method, route, major)] = _Window(self.route_limit, self.route_per)
+            retry_after = self._global.hit(now) or bucket.hit(now)
+        await asyncio.sleep(self.latency())
+        if retry_after is not None:
+            self.calls[(f"{method} {route}", 429)] += 1
+            raise discord.HTTPException(_Response(429, "Too Many Requests", retry_after), {"message": "You are being rate limited.", "code": 0})
+        if self.error_rate and route == ROLE_ROUTE and self._rng.random() < self.error_rate:
+            self.calls[(f"{method} {route}", 503)] += 1
+            raise discord.HTTPException(_Response(503, "Service Unavailable"), "upstream connect error")
+        self.calls[(f"{method} {route}", 200)] += 1
+
+    def call_counts(self) -> dict:
+        return {f"{route} {status}": count for (route, status), count in sorted(self.calls.items())}
+
+class SimRole:
+    def __init__(self, role_id, name, position, guild):
+        self.id = role_id
+        self.name = name
+        self.position = position
+        self.guild = guild
+
+    @property
+    def members(self):
+        # Like discord.py: only members in the guild's cache are visible
+        return [m for m in self.guild._cache.values() if self in m.roles]
+
+    def __le__(self, other):
+        return self.position <= other.position
+
+    def __lt__(self, other):
+        return self.position < other.position
+
+    def __repr__(self):
+        return f"<SimRole {self.name}>"
+
+class SimMember:
+    def __init__(self, member_id, guild, roles=()):
+        self.id = member_id
+        self.guild = guild
+        self.roles = list(roles)
+        self.display_name = f"user{member_id}"
+
+    @property
+    def top_role(self):
+        return max(self.roles, key=lambda r: r.position) if self.roles else self.guild.default_role
+
+    async def add_roles(self, role, **kwargs):
+        await self.guild._backend.request("PUT", ROLE_ROUTE, self.guild.id)
+        self.guild.set_role(self.id, role, True)
+
+    async def remove_roles(self, role, **kwargs):
+        await self.guild._backend.request("DELETE", ROLE_ROUTE, self.guild.id)
+        self.guild.set_role(self.id, role, False)
+
+    def __str__(self):
+        return self.display_name
+
+class SimGuild:
+    """
+    A guild with server-side membership and a client-side cache. With
+    cache_all the cache holds everyone (discord.py after chunking); without,
+    it starts empty and fills through query_members, as with MEMBER_CACHE=lean.
+    """
+
+    def __init__(self, backend, guild_id, member_ids, role_name, bot_user_id, cache_all=True):
+        self._backend = backend
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.default_role = SimRole(guild_id, "@everyone", 0, self)
+        self.role = SimRole(guild_id + 1, role_name, 1, self)
+        bot_role = SimRole(guild_id + 2, "bot", 10, self)
+        self.roles = [self.default_role, self.role, bot_role]
+        self._server = {member_id: set() for member_id in member_ids}  # user_id -> role ids, the truth
+        self._server[bot_user_id] = {bot_role.id}
+        self._roles_by_id = {role.id: role for role in self.roles}
+        self._cache = {}
+        self._listeners = []
+        self.bot_user_id = bot_user_id
+        self.queries = 0
+        for member_id in (self._server if cache_all else (bot_user_id,)):
+            self._cache_member(member_id)
+
+    def _cache_member(self, member_id):
+        member = SimMember(member_id, self, [self._roles_by_id[r] for r in self._server[member_id]])
+        self._cache[member_id] = member
+        return member
+
+    @property
+    def members(self):
+        return list(self._cache.values())
+
+    @property
+    def me(self):
+        return self._cache.get(self.bot_user_id)
+
+    def get_member(self, member_id):
+        return self._cache.get(member_id)
+
+    def _remove_member(self, member):
+        self._cache.pop(member.id, None)
+
+    async def query_members(self, query=None, *, limit=5, user_ids=None, presences=False, cache=True):
+        """Gateway REQUEST_GUILD_MEMBERS by user_ids; not rate limited per route, but not free either."""
+        self.queries += 1
+        await self._backend.request("OP8", "REQUEST_GUILD_MEMBERS", limited=False)
+        found = [user_id for user_id in (user_ids or ())[:limit] if user_id in self._server]
+        if cache:
+            return [self._cache.get(user_id) or self._cache_member(user_id) for user_id in found]
+        return [SimMember(user_id, self, [self._roles_by_id[r] for r in self._server[user_id]]) for user_id in found]
+
+    def give_role(self, member_ids):
+        """Set up initial role holders without API calls or events."""
+        for member_id in member_ids:
+            self._server[member_id].add(self.role.id)
+            member = self._cache.get(member_id)
+            if member is not None and self.role not in member.roles:
+                member.roles.append(self.role)
+
+    def on_member_update(self, listener):
+        """listener(before, after) is called for cached members, like the gateway event."""
+        self._listeners.append(listener)
+
+    def set_role(self, member_id, role, has_role):
+        """Apply a role change server-side (from the API or a moderator) and send the member update."""
+        roles = self._server[member_id]
+        if (role.id in roles) == has_role:
+            return
+        if has_role:
+            roles.add(role.id)
+        else:
+            roles.discard(role.id)
+        self._backend.role_changes.append((time.time(), self.id, member_id, has_role))
+        member = self._cache.get(member_id)
+        if member is None:
+            return
+        before = SimMember(member_id, self, member.roles)
+        member.roles = [self._roles_by_id[r] for r in roles]
+        for listener in self._listeners:
+            listener(before, member)
+
+    def has_role(self, member_id) -> bool:
+        return self.role.id in self._server.get(member_id, ())
+
+class SimUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class SimBot:
+    """The client: what role_service, the scheduler and the command handlers use of commands.Bot."""
+
+    def __init__(self, guilds, bot_user_id, connect_seconds=1.0):
+        self._guilds = {guild.id: guild for guild in guilds}
+        self.user = SimUser(bot_user_id)
+        self.connect_seconds = connect_seconds
+        self._ready = asyncio.Event()
+
+    async def connect(self):
+        """Pretend to connect to the gateway; wait_until_ready returns afterwards."""
+        await asyncio.sleep(self.connect_seconds)
+        self._ready.set()
+
+    @property
+    def guilds(self):
+        return list(self._guilds.values())
+
+    def get_guild(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    async def wait_until_ready(self):
+        await self._ready.wait()
+
+class SimTree:
+    """Collects slash command callbacks as register_*_commands defines them, by name."""
+
+    def __init__(self):
+        self.commands = {}
+
+    def command(self, *, name, description=None, guilds=None, **kwargs):
+        def decorator(fn):
+            self.commands[name] = fn
+            return fn
+        return decorator
+
+class _InteractionResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self.messages = []
+
+    async def send_message(self, content=None, **kwargs):
+        await self._interaction._callback()
+        self.messages.append(content)
+
+    async def defer(self, **kwargs):
+        await self._interaction._callback()
+
+class _Followup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self._interaction._callback()
+        self._interaction.response.messages.append(content)
+
+class SimInteraction:
+    """A slash command invocation by one member; replies cost one REST round trip each."""
+
+    _ids = iter(range(1, 1 << 62))
+
+    def __init__(self, bot, guild, user_id):
+        self.id = next(self._ids)
+        self.client = bot
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = guild.get_member(user_id) or SimUser(user_id)
+        self.response = _InteractionResponse(self)
+        self.followup = _Followup(self)
+
+    async def _callback(self):
+        await self.guild._backend.request("POST", INTERACTION_ROUTE, limited=False)
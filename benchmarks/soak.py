@@ -0,0 +1,326 @@
+"""
+End-to-end load and soak test against a simulated Discord (benchmarks.simdiscord).
+
+    python -m benchmarks.soak                                   # 2k users, 2 guilds, 5 minutes
+    python -m benchmarks.soak --mode event --users 20000 --duration 600
+    python -m benchmarks.soak --latency-ms 150 --route-limit 5 --error-rate 0.01
+    python -m benchmarks.soak --member-cache lean
+
+Runs the real scheduler (start_scheduler), role service, member-event drift
+correction and slash command handlers against simulated guilds whose role
+routes have latency, rate limits and errors. Every user's shift starts or
+ends during the run; on top of that, members run bursts of commands and
+moderators flip roles by hand. Reports role-change latency percentiles by
+cause (from when a change became due until the simulated API applied it),
+command latency, API calls by route and status, and how many members still
+had the wrong role at the end. Other settings (ROLE_*, FULL_RECONCILE_MINUTES,
+ACTIVE_USERS_BACKEND, ...) are read from the environment as usual.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from benchmarks import common
+
+BOT_USER_ID = 42
+# Commands in a burst, by weight; myschedule only reads
+COMMAND_MIX = {"setwork": 3, "sick": 1, "back": 1, "setdays": 1, "myschedule": 4}
+
+def _percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+
+    def pct(p):
+        return samples[min(len(samples) - 1, math.ceil(p * len(samples)) - 1)]
+
+    return {"count": len(samples), "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99), "max": samples[-1]}
+
+class Expectations:
+    """
+    What should happen to each member's role and since when: shift boundaries
+    (from the schedules), commands, and hand-made changes to undo. Matched
+    against the simulated API's role changes after the run.
+    """
+
+    def __init__(self, until_ts):
+        self.until_ts = until_ts
+        self.causes = {}  # key -> [(ts, has_role, kind)]
+
+    def add(self, key, ts, has_role, kind):
+        self.causes.setdefault(key, []).append((ts, has_role, kind))
+
+    def plan_shifts(self, key, from_utc):
+        """Replace key's future shift boundaries with those of its current schedule."""
+        from app.db.schedule import get_compiled_schedule
+        from app.utils.time_utils import get_next_role_change_utc
+
+        from_ts = from_utc.timestamp()
+        causes = self.causes[key] = [c for c in self.causes.get(key, []) if not (c[2] == "shift" and c[0] > from_ts)]
+        cs = get_compiled_schedule(*key)
+        t = from_utc
+        while cs is not None:
+            on_work, next_utc = get_next_role_change_utc(cs, t)
+            if next_utc is None or next_utc.timestamp() > self.until_ts:
+                break
+            causes.append((next_utc.timestamp(), not on_work, "shift"))
+            t = next_utc + timedelta(seconds=1)
+
+    def latencies(self, role_changes, initial, end_ts, grace):
+        """
+        {kind: [seconds]} from each cause to the role change that satisfied it,
+        plus counts of causes superseded by a newer one before being applied
+        and of causes still unapplied at end_ts (older than grace seconds).
+        """
+        changes = {}
+        for ts, guild_id, user_id, has_role in role_changes:
+            if ts > end_ts:
+                break
+            changes.setdefault((guild_id, user_id), []).append((ts, has_role))
+        result = {}
+        for key, causes in self.causes.items():
+            causes.sort()
+            history = changes.get(key, [])
+            times = [ts for ts, _ in history]
+            for i, (ts, want, kind) in enumerate(causes):
+                if ts > end_ts:
+                    break
+                stats = result.setdefault(kind, {"samples": [], "superseded": 0, "missed": 0})
+                before = bisect.bisect_right(times, ts)
+                actual = history[before - 1][1] if before else initial.get(key, False)
+                if actual == want:
+                    continue
+                next_ts = causes[i + 1][0] if i + 1 < len(causes) else math.inf
+                done = next((t for t, has_role in history[before:] if has_role == want), None)
+                if done is not None and done < next_ts:
+                    stats["samples"].append(done - ts)
+                elif next_ts <= end_ts:
+                    stats["superseded"] += 1
+                elif ts < end_ts - grace:
+                    stats["missed"] += 1
+        return result
+
+async def soak(args):
+    from app.core.config import GUILD_IDS, ROLE_NAME
+    from app.core.metrics import TICK_SECONDS
+    from app.db.database import get_connection
+    from app.db.guild_settings import load_guild_settings
+    from app.db.role_ledger import load_role_ledger
+    from app.db.schedule import load_schedule_store
+    from app.db.schedule_store import schedule_store
+    from app.bot.commands import schedule_commands, sick_commands
+    from app.scheduler.scheduler import start_scheduler
+    from app.services.drift import check_member, should_have_role
+    from app.services.role_service import get_reconciler, role_executor_stats, update_roles
+    from app.services.roster import DEFAULT_TIMEZONE
+    from app.services.schedule_service import get_active_users
+    from app.utils.time_utils import get_tz
+    from benchmarks.datagen import generate_soak_schedules
+    from benchmarks.simdiscord import SimBot, SimDiscord, SimGuild, SimInteraction, SimTree
+
+    rng = random.Random(args.seed)
+    started_utc = datetime.now(timezone.utc)
+    until_ts = started_utc.timestamp() + args.duration
+    rows = generate_soak_schedules(args.users, started_utc, max(1, args.duration // 60), args.seed, GUILD_IDS)
+    conn = get_connection()
+    with conn:
+        conn.executemany("INSERT INTO schedules VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    load_schedule_store()
+    load_guild_settings()
+    load_role_ledger()
+
+    backend = SimDiscord(
+        latency_ms=args.latency_ms, route_limit=args.route_limit, route_per=args.route_per,
+        global_limit=args.global_limit, error_rate=args.error_rate, seed=args.seed,
+    )
+    scheduled = [(row[0], row[1]) for row in rows]
+    by_guild = {guild_id: [] for guild_id in GUILD_IDS}
+    for guild_id, user_id in scheduled:
+        by_guild[guild_id].append(user_id)
+    extra = args.extra_members // len(GUILD_IDS)
+    guilds = []
+    initial = {}
+    for guild_id, ids in by_guild.items():
+        guild = SimGuild(backend, guild_id, ids + [5_000_000 + i for i in range(extra)], ROLE_NAME, BOT_USER_ID, args.member_cache == "full")
+        # Start with roughly what the previous run would have left, plus some drift
+        for user_id in ids:
+            initial[(guild_id, user_id)] = should_have_role(guild_id, user_id, started_utc) != (rng.random() < args.initial_drift)
+        guild.give_role([user_id for user_id in ids if initial[(guild_id, user_id)]])
+        guilds.append(guild)
+    bot = SimBot(guilds, BOT_USER_ID)
+
+    def on_member_update(before, after):  # as in app.bot.client
+        if before.roles != after.roles:
+            check_member(bot, after)
+
+    for guild in guilds:
+        guild.on_member_update(on_member_update)
+
+    expect = Expectations(until_ts)
+    for key in scheduled:
+        if initial[key] != should_have_role(*key, started_utc):
+            expect.add(key, started_utc.timestamp(), not initial[key], "startup")
+        expect.plan_shifts(key, started_utc)
+
+    tree = SimTree()
+    await schedule_commands.register_schedule_commands(tree, GUILD_IDS)
+    await sick_commands.register_sick_commands(tree, GUILD_IDS)
+    command_seconds = {name: [] for name in COMMAND_MIX}
+    command_failures = {name: 0 for name in COMMAND_MIX}
+
+    def command_args(name, key):
+        # /setwork keeps the user's time zone, so its times are local to that
+        row = schedule_store.get(*key)
+        now_local = datetime.now(get_tz(row["timezone"] if row else DEFAULT_TIMEZONE))
+        if name == "setwork":
+            start = now_local + timedelta(minutes=rng.randint(-120, 5))
+            end = now_local + timedelta(minutes=rng.randint(1, 120))
+            return {"start": start.strftime("%H:%M"), "end": end.strftime("%H:%M"), "days": "0,1,2,3,4,5,6"}
+        if name == "sick":
+            return {"hours": 1}
+        if name == "setdays":
+            return {"days": ",".join(str(d) for d in sorted(rng.sample(range(7), rng.randint(1, 7))))}
+        return {}
+
+    async def run_command(name, key):
+        guild_id, user_id = key
+        interaction = SimInteraction(bot, bot.get_guild(guild_id), user_id)
+        started = time.perf_counter()
+        ts = time.time()
+        try:
+            await tree.commands[name](interaction, **command_args(name, key))
+        except Exception:
+            # A failed reply; the handler may or may not have saved anything first
+            command_failures[name] += 1
+            expect.plan_shifts(key, datetime.now(timezone.utc))
+            return
+        command_seconds[name].append(time.perf_counter() - started)
+        if name != "myschedule":
+            expect.add(key, ts, should_have_role(guild_id, user_id), "command")
+            expect.plan_shifts(key, datetime.now(timezone.utc))
+
+    async def command_bursts():
+        names, weights = list(COMMAND_MIX), list(COMMAND_MIX.values())
+        while time.time() < until_ts:
+            await asyncio.sleep(args.burst_every)
+            keys = rng.sample(scheduled, min(args.burst_size, len(scheduled)))
+            await asyncio.gather(*(run_command(rng.choices(names, weights)[0], key) for key in keys))
+
+    async def moderators():
+        while time.time() < until_ts:
+            await asyncio.sleep(args.drift_every)
+            for guild_id, user_id in rng.sample(scheduled, min(args.drift_size, len(scheduled))):
+                guild = bot.get_guild(guild_id)
+                guild.set_role(user_id, guild.role, not guild.has_role(user_id))
+                expect.add((guild_id, user_id), time.time(), should_have_role(guild_id, user_id), "drift")
+
+    print(f"Soaking {args.users} users in {len(GUILD_IDS)} guild(s) for {args.duration}s ({args.mode} mode)...", file=sys.stderr)
+    start_scheduler(bot)
+    await bot.connect()
+    load = [asyncio.create_task(command_bursts()), asyncio.create_task(moderators())]
+    await asyncio.sleep(max(0.0, until_ts - time.time()))
+    for task in load:
+        task.cancel()
+    await asyncio.gather(*load, return_exceptions=True)
+    await asyncio.sleep(args.settle)
+    end_ts = time.time()
+    for guild_id in GUILD_IDS:
+        await get_reconciler(bot, guild_id).wait()
+
+    wrong = sum(bot.get_guild(g).has_role(u) != should_have_role(g, u) for g, u in scheduled)
+    calls_before_audit = sum(backend.calls.values())
+    audit = await update_roles(bot, get_active_users())
+    matched = expect.latencies(backend.role_changes, initial, end_ts, args.settle + (60 if args.mode == "poll" else 5))
+
+    ticks, tick_total, tick_p95 = TICK_SECONDS.stats(mode=args.mode)
+    return {
+        "users": args.users,
+        "guilds": len(GUILD_IDS),
+        "mode": args.mode,
+        "member_cache": args.member_cache,
+        "duration": args.duration,
+        "role_change_latency": {
+            kind: {**_percentiles(stats["samples"]), "superseded": stats["superseded"], "missed": stats["missed"]}
+            for kind, stats in sorted(matched.items())
+        },
+        "command_latency": {name: _percentiles(samples) for name, samples in command_seconds.items()},
+        "command_failures": command_failures,
+        "api_calls": backend.call_counts(),
+        "api_calls_total": calls_before_audit,
+        "member_queries": sum(guild.queries for guild in guilds),
+        "executor": role_executor_stats(),
+        "ticks": {"count": ticks, "mean": tick_total / ticks if ticks else 0.0, "p95_bucket": tick_p95},
+        "wrong_at_end": wrong,
+        "audit_fixes": sum(len(r.adds) + len(r.removes) for r in audit.values()),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--guilds", type=int, default=2)
+    parser.add_argument("--extra-members", type=int, default=1_000, help="guild members without a schedule")
+    parser.add_argument("--duration", type=int, default=300, help="seconds; shift boundaries are spread over its whole minutes")
+    parser.add_argument("--mode", choices=("poll", "event"), default="poll")
+    parser.add_argument("--member-cache", choices=("full", "lean"), default="full")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="median REST latency")
+    parser.add_argument("--route-limit", type=int, default=5, help="role requests per guild per --route-per seconds before 429s")
+    parser.add_argument("--route-per", type=float, default=1.0)
+    parser.add_argument("--global-limit", type=int, default=50, help="requests per second across all routes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of role requests failing with 503")
+    parser.add_argument("--initial-drift", type=float, default=0.05, help="share of members starting in the wrong state")
+    parser.add_argument("--burst-every", type=float, default=10.0, help="seconds between command bursts")
+    parser.add_argument("--burst-size", type=int, default=50, help="commands per burst")
+    parser.add_argument("--drift-every", type=float, default=15.0, help="seconds between hand-made role changes")
+    parser.add_argument("--drift-size", type=int, default=5)
+    parser.add_argument("--settle", type=float, default=5.0, help="seconds to let queued work finish after the run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="soak_results.json")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        common.configure_env(
+            os.path.join(tmp, "soak.db"), args.guilds,
+            settings={"SCHEDULER_MODE": args.mode, "MEMBER_CACHE": args.member_cache},
+        )
+        from app.db import repository
+        from app.db.database import close_connections, init_db
+
+        init_db()
+        try:
+            result = asyncio.run(soak(args))
+        finally:
+            repository.shutdown()
+            close_connections()
+
+    report = {
+        "commit": common.git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "result": result,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for kind, stats in result["role_change_latency"].items():
+        if stats["count"]:
+            print(
+                f"{kind:>8}: {stats['count']:>6} changes  p50={stats['p50']:7.2f}s  p95={stats['p95']:7.2f}s  "
+                f"p99={stats['p99']:7.2f}s  max={stats['max']:7.2f}s  missed={stats['missed']}"
+            )
+    print(f"API calls: {result['api_calls_total']}  ({', '.join(f'{k}: {v}' for k, v in result['api_calls'].items())})")
+    if any(result["command_failures"].values()):
+        print(f"Failed commands: {', '.join(f'{k}: {v}' for k, v in result['command_failures'].items() if v)}")
+    print(f"Wrong at end: {result['wrong_at_end']}  fixed by final audit: {result['audit_fixes']}")
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()